@@ -0,0 +1,68 @@
+"""
+Measures cold-start import cost for the GUI and per-child spawn latency.
+
+Usage (from the repository root):
+    python -m benchmarks.startup --repeat 5
+"""
+import argparse
+import multiprocessing
+import statistics
+import subprocess
+import sys
+import time
+
+# Modules the GUI process and a worker child need, measured in fresh interpreters
+IMPORT_TARGETS = {
+    "gui (ui.app)": "ui.app",
+    "engine (core.engine)": "core.engine",
+    "child (core.workers)": "core.workers",
+}
+
+def _child_probe(started_at, result_queue):
+    """Reports how long after Process.start() the child was ready to work."""
+    import core.workers  # What a real worker imports; free if preloaded
+    result_queue.put(time.perf_counter() - started_at)
+
+def measure_import(module, repeat):
+    """Fresh-interpreter import time of `module` in seconds (median of `repeat`)."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+def measure_spawn(start_method, repeat):
+    """Returns (first_spawn, median_later_spawn) latency in seconds for a start method."""
+    # Imported here so children unpickling _child_probe do not also load the engine
+    from core.engine import get_mp_context
+    ctx = get_mp_context(start_method)
+    result_queue = ctx.Queue()
+    samples = []
+    for _ in range(repeat + 1):
+        p = ctx.Process(target=_child_probe, args=(time.perf_counter(), result_queue))
+        p.start()
+        samples.append(result_queue.get(timeout=60))
+        p.join()
+    return samples[0], statistics.median(samples[1:]) if len(samples) > 1 else samples[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--methods", nargs="*", default=multiprocessing.get_all_start_methods())
+    args = parser.parse_args()
+
+    print("Import time (fresh interpreter, median):")
+    for label, module in IMPORT_TARGETS.items():
+        try:
+            print(f"  {label:<24} {measure_import(module, args.repeat) * 1000:8.1f} ms")
+        except subprocess.CalledProcessError as e:
+            print(f"  {label:<24} failed: {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
+
+    print("Child ready latency (Process.start -> core.workers imported):")
+    for method in args.methods:
+        first, steady = measure_spawn(method, args.repeat)
+        print(f"  {method:<24} first {first * 1000:8.1f} ms | later {steady * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,2 +1,7 @@
-# Expose the main engine class directly
-from .engine import VideoEngine
\ No newline at end of file
+# Expose the main engine class directly (imported lazily so child processes
+# that only need core.workers do not pull in the engine's dependencies)
+def __getattr__(name):
+    if name == "VideoEngine":
+        from .engine import VideoEngine
+        return VideoEngine
+    raise AttributeError(f"module 'core' has no attribute '{name}'")
\ No newline at end of file
@@ -0,0 +1,105 @@
+import os
+import logging
+import psutil
+
+MB = 1024 ** 2
+
+class MemoryPlan:
+    """Planned footprint of one engine run (all sizes in bytes)."""
+    def __init__(self, slots, requested_slots, frame_nbytes, rings, ring_bytes, reorder_bytes,
+                 scratch_bytes, available_bytes, shm_free_bytes):
+        self.slots = slots
+        self.requested_slots = requested_slots
+        self.frame_nbytes = frame_nbytes
+        self.rings = rings
+        self.ring_bytes = ring_bytes          # Shared memory (lives in /dev/shm)
+        self.reorder_bytes = reorder_bytes    # Consumer's out-of-order frame copies
+        self.scratch_bytes = scratch_bytes    # Per-worker working buffers
+        self.available_bytes = available_bytes
+        self.shm_free_bytes = shm_free_bytes
+
+    @property
+    def total_bytes(self):
+        return self.ring_bytes + self.reorder_bytes + self.scratch_bytes
+
+    @property
+    def shrunk(self):
+        return self.slots < self.requested_slots
+
+    def summary(self):
+        text = (f"Memory plan: {self.slots} slots x {self.rings} rings x {self.frame_nbytes / MB:.1f} MB = "
+                f"{self.ring_bytes / MB:.0f} MB shared, {self.reorder_bytes / MB:.0f} MB reorder, "
+                f"{self.scratch_bytes / MB:.0f} MB worker scratch | total {self.total_bytes / MB:.0f} MB "
+                f"of {self.available_bytes / MB:.0f} MB available")
+        if self.shrunk:
+            text += f" (shrunk from {self.requested_slots} slots)"
+        return text
+
+def shm_free_bytes(path="/dev/shm"):
+    """Free space on the shared-memory filesystem (None where there is none, e.g. Windows)."""
+    if not hasattr(os, "statvfs") or not os.path.isdir(path):
+        return None
+    st = os.statvfs(path)
+    return st.f_bavail * st.f_frsize
+
+class MemoryBudget:
+    """
+    Sizes the ring buffers from the real frame size instead of a fixed guess.
+    Only `ram_fraction` of currently *available* RAM (minus a reserve for the
+    OS and GUI) may be planned, so a run never pushes the host into swap.
+    """
+    def __init__(self, ram_fraction=0.5, reserve_mb=512, min_slots=4):
+        self.ram_fraction = ram_fraction
+        self.reserve_bytes = reserve_mb * MB
+        self.min_slots = min_slots
+
+    def _limits(self):
+        available = psutil.virtual_memory().available
+        ram_limit = int(available * self.ram_fraction) - self.reserve_bytes
+        return available, ram_limit, shm_free_bytes()
+
+    @staticmethod
+    def _costs(frame_nbytes, worker_count, rings, reorder_window, scratch_frames):
+        # Fixed: each worker holds a few full-frame temporaries
+        fixed = worker_count * scratch_frames * frame_nbytes
+        per_slot = rings * frame_nbytes
+        if reorder_window is None:
+            # Worst case the consumer holds a copy of every slot while waiting
+            per_slot += frame_nbytes
+        else:
+            fixed += reorder_window * frame_nbytes
+        return fixed, per_slot
+
+    def max_slots(self, frame_nbytes, worker_count, rings=2, reorder_window=None, scratch_frames=3):
+        """Largest ring depth that fits the current budget (may be below min_slots)."""
+        _, ram_limit, shm_free = self._limits()
+        fixed, per_slot = self._costs(frame_nbytes, worker_count, rings, reorder_window, scratch_frames)
+        slots = max(0, (ram_limit - fixed) // per_slot)
+        if shm_free is not None:
+            slots = min(slots, shm_free // (rings * frame_nbytes))
+        return int(slots)
+
+    def plan(self, frame_nbytes, requested_slots, worker_count, rings=2, reorder_window=None, scratch_frames=3):
+        """
+        Returns a MemoryPlan with the requested depth, shrunk to fit if needed.
+        Raises MemoryError if not even a minimal ring fits.
+        """
+        available, _, shm_free = self._limits()
+        fits = self.max_slots(frame_nbytes, worker_count, rings, reorder_window, scratch_frames)
+        floor = max(self.min_slots, worker_count + 1)  # Every worker needs a slot plus one for the producer
+        if fits < floor:
+            raise MemoryError(
+                f"Not enough memory for {frame_nbytes / MB:.1f} MB frames: need at least {floor} slots, "
+                f"budget allows {fits} ({available / MB:.0f} MB RAM available"
+                + (f", {shm_free / MB:.0f} MB free in /dev/shm)" if shm_free is not None else ")")
+            )
+
+        slots = max(floor, min(requested_slots, fits))
+        if slots < requested_slots:
+            logging.warning(f"Buffer reduced from {requested_slots} to {slots} slots to stay within memory budget")
+
+        ring_bytes = rings * frame_nbytes * slots
+        reorder_bytes = (slots if reorder_window is None else reorder_window) * frame_nbytes
+        scratch_bytes = worker_count * scratch_frames * frame_nbytes
+        return MemoryPlan(slots, requested_slots, frame_nbytes, rings, ring_bytes, reorder_bytes,
+                          scratch_bytes, available, shm_free)
\ No newline at end of file
@@ -0,0 +1,493 @@
+"""
+Distributed mode: a coordinator shards a video across node agents over TCP.
+
+The coordinator decodes the input into fixed-length segments (about one GOP
+each), ships every segment as a batch of compressed frames to an agent, and
+writes the returned segments to the output in order. Agents run the normal
+effects pipeline across their local cores. When a node is lost, its
+segment goes back on the queue for the remaining nodes.
+
+Single-machine test (two agents on loopback):
+    python -m core.distributed agent --port 9101 &
+    python -m core.distributed agent --port 9102 &
+    python -m core.distributed run in.mp4 out.mp4 --nodes 127.0.0.1:9101 127.0.0.1:9102 --effects Sharpen
+"""
+import argparse
+import collections
+import importlib
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from core.engine import get_mp_context
+from core.pipeline import build_pipeline
+from core.workers import open_video_writer
+
+# --- WIRE FORMAT ---
+# [4-byte JSON header length][JSON header][binary blobs, lengths listed in header["blobs"]]
+# JSON + raw bytes only: nothing received from the network is unpickled.
+_LEN = struct.Struct("!I")
+
+# Lengths come from the peer, so they are checked before anything is allocated
+MAX_HEADER_BYTES = 1 << 20
+MAX_MESSAGE_BYTES = 2 << 30     # A 2 s segment of lossless 4K frames fits comfortably
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(min(size - len(data), 1 << 20))
+        if not chunk:
+            raise ConnectionError("Peer closed the connection")
+        data.extend(chunk)
+    return bytes(data)
+
+def send_message(sock, header, blobs=()):
+    header = dict(header, blobs=[len(b) for b in blobs])
+    payload = json.dumps(header).encode("utf-8")
+    sock.sendall(_LEN.pack(len(payload)) + payload)
+    for blob in blobs:
+        sock.sendall(blob)
+
+def recv_message(sock, max_bytes=MAX_MESSAGE_BYTES):
+    """Reads one message. Raises ValueError (and reads nothing more) if it is malformed or over `max_bytes`."""
+    (size,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    if size > MAX_HEADER_BYTES:
+        raise ValueError(f"Message header of {size} bytes exceeds {MAX_HEADER_BYTES}")
+    header = json.loads(_recv_exact(sock, size).decode("utf-8"))
+    lengths = header.get("blobs", []) if isinstance(header, dict) else None
+    if not isinstance(lengths, list) or not all(isinstance(n, int) and n >= 0 for n in lengths):
+        raise ValueError("Malformed message header")
+    if sum(lengths) > max_bytes:
+        raise ValueError(f"Message of {sum(lengths)} bytes exceeds the {max_bytes}-byte limit")
+    blobs = [_recv_exact(sock, n) for n in lengths]
+    return header, blobs
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+# --- NODE AGENT ---
+_agent_pipeline = None
+
+def _import_plugins(modules):
+    for module in modules:
+        importlib.import_module(module)
+
+def _init_agent_worker(spec, plugins):
+    global _agent_pipeline
+    _import_plugins(plugins)
+    _agent_pipeline = build_pipeline(spec)
+
+def _process_encoded(item):
+    """Decode -> effects -> encode for one frame (runs in the agent's pool)."""
+    blob, ext, params = item
+    frame = cv2.imdecode(np.frombuffer(blob, dtype=np.uint8), cv2.IMREAD_COLOR)
+    processed = _agent_pipeline.run(frame)
+    ok, encoded = cv2.imencode(ext, processed, params)
+    if not ok:
+        raise RuntimeError(f"Could not encode frame as {ext}")
+    return encoded.tobytes()
+
+class NodeAgent:
+    """
+    Accepts segments from a coordinator, runs the effects pipeline on a local
+    process pool and returns the processed segment.
+
+    Only plugin modules in `plugins` are ever imported, and they are imported
+    from the agent's own configuration. A pipeline whose "plugins" list names
+    anything else is rejected, so a peer cannot make the agent import code.
+    """
+    def __init__(self, host="127.0.0.1", port=0, workers=None, plugins=(), max_message_bytes=MAX_MESSAGE_BYTES):
+        self.host = host
+        self.port = port
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.plugins = tuple(plugins)
+        self.max_message_bytes = max_message_bytes
+        # Connection handlers are threads, and forking a threaded process can
+        # copy a held lock into the child, so pools come from a fresh server
+        self.ctx = get_mp_context()
+        self.server = None
+        self.stop_event = threading.Event()
+        # Registers the allowed plugins' effects for spec validation
+        _import_plugins(self.plugins)
+
+    def bind(self):
+        self.server = socket.create_server((self.host, self.port))
+        self.port = self.server.getsockname()[1]
+        return self.port
+
+    def serve_forever(self):
+        if self.server is None:
+            self.bind()
+        logging.info(f"Node agent listening on {self.host}:{self.port} ({self.workers} workers)")
+        self.server.settimeout(0.5)
+        while not self.stop_event.is_set():
+            try:
+                conn, addr = self.server.accept()
+            except socket.timeout:
+                continue
+            threading.Thread(target=self._handle, args=(conn, addr), daemon=True).start()
+        self.server.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _handle(self, conn, addr):
+        pool, pool_spec = None, None
+        try:
+            with conn:
+                while True:
+                    try:
+                        header, blobs = recv_message(conn, self.max_message_bytes)
+                    except ConnectionError:
+                        break
+                    if header.get("type") != "segment":
+                        send_message(conn, {"type": "error", "message": f"Unknown message {header.get('type')}"})
+                        continue
+
+                    try:
+                        spec = self._check_pipeline(header.get("pipeline"))
+                        spec_key = json.dumps(spec, sort_keys=True)
+                        if spec_key != pool_spec:
+                            # Unknown effects or bad graphs fail here, not in the pool initializer
+                            build_pipeline(spec)
+                    except ValueError as e:
+                        logging.warning(f"Rejected segment from {addr}: {e}")
+                        send_message(conn, {"type": "error", "message": str(e)})
+                        continue
+
+                    # One pool per connection; rebuilt only if the pipeline changes
+                    if spec_key != pool_spec:
+                        if pool: pool.terminate()
+                        pool = self.ctx.Pool(self.workers, initializer=_init_agent_worker, initargs=(spec, self.plugins))
+                        pool_spec = spec_key
+
+                    ext, params = header["codec"], header.get("codec_params", [])
+                    results = pool.map(_process_encoded, [(blob, ext, params) for blob in blobs])
+                    send_message(conn, {"type": "result", "segment": header["segment"]}, results)
+        except Exception as e:
+            logging.error(f"Agent connection {addr} failed: {e}")
+        finally:
+            if pool: pool.terminate()
+
+    def _check_pipeline(self, spec):
+        """Returns a spec safe to compile: plugins outside the allowlist are refused, never imported."""
+        if not isinstance(spec, dict):
+            raise ValueError("Pipeline must be a spec object")
+        requested = spec.get("plugins") or []
+        if not isinstance(requested, list):
+            raise ValueError("Pipeline plugins must be a list of module names")
+        refused = [module for module in requested if module not in self.plugins]
+        if refused:
+            raise ValueError(f"Plugins not allowed on this agent: {', '.join(map(str, refused))}")
+        # The pool imports the allowlist itself; nothing from the wire reaches importlib
+        return {key: value for key, value in spec.items() if key != "plugins"}
+
+def run_agent(host, port, workers, plugins=()):
+    agent = NodeAgent(host, port, workers, plugins)
+    agent.serve_forever()
+
+def spawn_local_agents(count, workers=1, host="127.0.0.1", plugins=()):
+    """
+    Starts `count` agents on free loopback ports. Returns (processes, addresses);
+    the caller terminates the processes (agents own process pools, so they
+    cannot be daemonic).
+    """
+    procs, addresses = [], []
+    for _ in range(count):
+        with socket.socket() as probe:
+            probe.bind((host, 0))
+            port = probe.getsockname()[1]
+        p = get_mp_context().Process(target=run_agent, args=(host, port, workers, plugins))
+        p.start()
+        procs.append(p)
+        addresses.append((host, port))
+
+    # Wait until every agent accepts connections
+    deadline = time.time() + 10.0
+    for address in addresses:
+        while True:
+            try:
+                socket.create_connection(address, timeout=0.5).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError(f"Agent at {address[0]}:{address[1]} did not start")
+                time.sleep(0.05)
+    return procs, addresses
+
+# --- COORDINATOR ---
+class Coordinator:
+    """
+    Splits a video into segments, farms them out to node agents and
+    reassembles the output in order.
+
+    `lock` guards only the segment queue and ordering state. Decoding the
+    input is serialised by `read_lock`, writing by `write_lock`. Frame
+    encode/decode runs on `codec_pool` (OpenCV releases the GIL), so node
+    threads never wait on each other's codec work.
+
+    Frames travel as lossless PNG by default, so output matches a local
+    render. codec=".jpg" is an opt-in trade: far less bandwidth, but every
+    frame is JPEG-encoded twice (there and back) before the final encode.
+    """
+    def __init__(self, nodes, segment_frames=None, codec=".png", quality=95,
+                 max_attempts=3, timeout=300.0, codec_threads=None):
+        self.nodes = [parse_address(n) if isinstance(n, str) else tuple(n) for n in nodes]
+        self.segment_frames = segment_frames  # Defaults to ~2 s of video (a typical GOP)
+        self.codec = codec
+        # PNG level 1: still lossless, and several times faster to encode than the default
+        self.codec_params = [cv2.IMWRITE_JPEG_QUALITY, quality] if codec == ".jpg" else [cv2.IMWRITE_PNG_COMPRESSION, 1]
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.codec_threads = codec_threads or os.cpu_count() or 2
+
+        self.lock = threading.Condition()
+        self.read_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.codec_pool = None
+        self.cap = None
+        self.first_frame = None
+        self.writer = None
+        self.next_segment_id = 0
+        self.source_done = False
+        self.in_flight = 0
+        self.retry = collections.deque()   # Segments reclaimed from lost nodes
+        self.attempts = {}
+        self.results = {}
+        self.next_to_write = 0
+        self.frames_written = 0
+        self.lost_nodes = []
+        self.error = None
+
+    def run(self, video_path, output_path, effects):
+        """Processes `video_path` into `output_path`. Returns a stats dict."""
+        pipeline = build_pipeline(effects)
+
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened(): raise Exception("Could not open video file.")
+        ret, self.first_frame = self.cap.read()
+        if not ret: raise Exception("Could not read first video frame.")
+        shape = self.first_frame.shape
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        if not self.segment_frames:
+            self.segment_frames = max(1, int(round(fps * 2)))
+
+        self.writer = open_video_writer(output_path, fps, shape)
+        self.codec_pool = ThreadPoolExecutor(self.codec_threads, thread_name_prefix="codec")
+        start = time.time()
+        try:
+            threads = [threading.Thread(target=self._drive_node, args=(addr, pipeline.spec, shape), daemon=True)
+                       for addr in self.nodes]
+            for t in threads: t.start()
+            for t in threads: t.join()
+        finally:
+            self.codec_pool.shutdown()
+            self.cap.release()
+            if self.writer: self.writer.release()
+
+        if self.error:
+            raise RuntimeError(self.error)
+        if self.retry or self.results or not self.source_done:
+            raise RuntimeError(f"All nodes lost before the job finished ({len(self.lost_nodes)} lost)")
+        return {
+            "frames": self.frames_written,
+            "segments": self.next_to_write,
+            "seconds": time.time() - start,
+            "lost_nodes": list(self.lost_nodes),
+        }
+
+    def _read_frame(self):
+        if self.first_frame is not None:
+            frame, self.first_frame = self.first_frame, None
+            return True, frame
+        return self.cap.read()
+
+    def _encode(self, frame, shape):
+        if frame.shape != shape:
+            frame = cv2.resize(frame, (shape[1], shape[0]))
+        ok, encoded = cv2.imencode(self.codec, frame, self.codec_params)
+        if not ok:
+            raise RuntimeError(f"Could not encode frame as {self.codec}")
+        return encoded.tobytes()
+
+    @staticmethod
+    def _decode(blob, shape):
+        frame = cv2.imdecode(np.frombuffer(blob, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame.shape != shape:
+            frame = cv2.resize(frame, (shape[1], shape[0]))
+        return frame
+
+    def _next_segment(self, shape):
+        """
+        Returns (segment_id, encoded_frames), or None once the input is
+        exhausted and no other node still holds a segment that may come back.
+        """
+        while True:
+            with self.lock:
+                while True:
+                    if self.error:
+                        return None
+                    if self.retry:
+                        self.in_flight += 1
+                        return self.retry.popleft()
+                    if not self.source_done:
+                        # Reserve before reading so no node sees an empty, idle job meanwhile
+                        self.in_flight += 1
+                        break
+                    if self.in_flight == 0:
+                        return None
+                    # Another node may still fail and hand its segment back
+                    self.lock.wait(0.5)
+
+            # Decode in order under read_lock; encoding overlaps on the pool
+            futures = []
+            with self.read_lock:
+                if not self.source_done:
+                    while len(futures) < self.segment_frames:
+                        ret, frame = self._read_frame()
+                        if not ret:
+                            with self.lock:
+                                self.source_done = True
+                            break
+                        futures.append(self.codec_pool.submit(self._encode, frame, shape))
+                    if futures:
+                        segment_id = self.next_segment_id
+                        self.next_segment_id += 1
+            if futures:
+                return segment_id, [future.result() for future in futures]
+
+            # Input ran out under us: release the reservation and look again
+            with self.lock:
+                self.in_flight -= 1
+                self.lock.notify_all()
+
+    def _drive_node(self, address, spec, shape):
+        try:
+            sock = socket.create_connection(address, timeout=self.timeout)
+        except OSError as e:
+            self._node_lost(address, None, e)
+            return
+
+        with sock:
+            while True:
+                try:
+                    segment = self._next_segment(shape)
+                except Exception as e:
+                    self._fail(f"Could not read the input: {e}")
+                    return
+                if segment is None:
+                    return
+                segment_id, blobs = segment
+                try:
+                    send_message(sock, {"type": "segment", "segment": segment_id, "pipeline": spec,
+                                        "codec": self.codec, "codec_params": self.codec_params}, blobs)
+                    header, results = recv_message(sock)
+                    if header.get("type") == "error":
+                        # The agent refused the job itself; another node would too
+                        self._fail(f"Node {address[0]}:{address[1]} rejected segment {segment_id}: {header.get('message')}")
+                        return
+                    if header.get("type") != "result" or len(results) != len(blobs):
+                        raise ConnectionError(f"Bad reply for segment {segment_id}: {header}")
+                except (OSError, ConnectionError, ValueError) as e:
+                    self._node_lost(address, segment, e)
+                    return
+                try:
+                    self._store(segment_id, results, shape)
+                except Exception as e:
+                    self._fail(f"Could not write segment {segment_id}: {e}")
+                    return
+
+    def _fail(self, message):
+        with self.lock:
+            self.error = self.error or message
+            self.lock.notify_all()
+
+    def _node_lost(self, address, segment, error):
+        with self.lock:
+            self.lost_nodes.append(f"{address[0]}:{address[1]}")
+            logging.warning(f"Node {address[0]}:{address[1]} lost: {error}")
+            if segment is None:
+                return
+            self.in_flight -= 1
+            segment_id = segment[0]
+            self.attempts[segment_id] = self.attempts.get(segment_id, 0) + 1
+            if self.attempts[segment_id] >= self.max_attempts:
+                self.error = f"Segment {segment_id} failed on {self.attempts[segment_id]} nodes"
+            else:
+                # Reassign to whichever node asks next
+                self.retry.appendleft(segment)
+            self.lock.notify_all()
+
+    def _store(self, segment_id, results, shape):
+        with self.lock:
+            self.in_flight -= 1
+            self.results[segment_id] = results
+            self.lock.notify_all()
+        self._flush(shape)
+
+    def _flush(self, shape):
+        """Writes completed segments in order. Whichever node thread gets write_lock drains them all."""
+        while True:
+            if not self.write_lock.acquire(blocking=False):
+                return      # The holder re-checks after releasing, so nothing is left behind
+            try:
+                while True:
+                    with self.lock:
+                        blobs = self.results.pop(self.next_to_write, None)
+                    if blobs is None:
+                        break
+                    # Decoding fans out on the pool; map() hands frames back in order
+                    for frame in self.codec_pool.map(self._decode, blobs, [shape] * len(blobs)):
+                        self.writer.write(frame)
+                    with self.lock:
+                        self.frames_written += len(blobs)
+                        self.next_to_write += 1
+                        self.lock.notify_all()
+            finally:
+                self.write_lock.release()
+            with self.lock:
+                if self.next_to_write not in self.results:
+                    return
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    agent = sub.add_parser("agent", help="Run a node agent")
+    agent.add_argument("--host", default="127.0.0.1")
+    agent.add_argument("--port", type=int, default=9100)
+    agent.add_argument("--workers", type=int, default=None)
+    agent.add_argument("--plugins", nargs="*", default=[],
+                       help="Plugin modules this agent may load; pipelines naming any other plugin are rejected")
+
+    run = sub.add_parser("run", help="Coordinate a job across agents")
+    run.add_argument("video")
+    run.add_argument("output")
+    run.add_argument("--nodes", nargs="+", required=True, help="host:port of each agent")
+    run.add_argument("--effects", nargs="*", default=[], help="Effect names or a single .json/.yaml spec path")
+    run.add_argument("--segment-frames", type=int, default=None)
+    run.add_argument("--codec", default=".png", choices=[".png", ".jpg"],
+                     help="Frame transport: .png is lossless; .jpg is lossy (JPEG twice per frame) but much smaller")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s')
+
+    if args.mode == "agent":
+        run_agent(args.host, args.port, args.workers, args.plugins)
+    else:
+        effects = args.effects
+        if len(effects) == 1 and os.path.splitext(effects[0])[1].lower() in (".json", ".yaml", ".yml"):
+            effects = effects[0]
+        stats = Coordinator(args.nodes, args.segment_frames, args.codec).run(args.video, args.output, effects)
+        print(f"Wrote {stats['frames']} frames in {stats['segments']} segments "
+              f"({stats['seconds']:.1f}s, lost nodes: {len(stats['lost_nodes'])})")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -2,98 +2,449 @@ import multiprocessing
 import queue
 import time
 import os
-import cv2
+import atexit
+import logging
+import threading
+import collections
+import uuid
 import numpy as np
-from core.memory import SharedMemoryBuffer
-from core.workers import producer_task, worker_task, consumer_task
+from core.memory import SharedMemoryBuffer, make_segment_name, reclaim_orphaned_segments
+from core.slots import SlotTable, FRAME, STATE, READY, QUEUED, CLAIMED, DROPPED as SLOT_DROPPED
+from core.placement import PlacementPolicy
+from core.budget import MemoryBudget
+from core.progress import ProgressTracker, TOTAL, WRITTEN, DROPPED, counter_cells, claimed_cell, processed_cell
+from core.profiling import profiled, merge_profiles
+
+# Tasks the dispatcher keeps queued per worker (one running + one ready to go)
+WORKER_PREFETCH = 2
+
+# NOTE: cv2 and the worker/effects modules are imported on first use so the
+# GUI can show its window without paying for OpenCV. Child processes only
+# import core.workers; under forkserver it is preloaded once and every
+# worker is forked from that warm process.
+CHILD_PRELOAD = ["core.workers"]
+
+def get_mp_context(start_method=None):
+    """Returns the multiprocessing context (forkserver with preload where available)."""
+    if start_method is None and "forkserver" in multiprocessing.get_all_start_methods():
+        start_method = "forkserver"
+    ctx = multiprocessing.get_context(start_method)
+    if ctx.get_start_method() == "forkserver":
+        ctx.set_forkserver_preload(CHILD_PRELOAD)
+    return ctx
 
 class VideoEngine:
-    def __init__(self):
+    def __init__(self, start_method=None):
+        self.ctx = get_mp_context(start_method)
         self.procs = []
-        self.input_queue = None 
-        self.output_queue = None
-        self.stop_event = multiprocessing.Event()
+        self.input_queue = None   # Producer -> dispatcher (read only by this process)
+        self.task_queues = []     # Dispatcher -> each worker (replaced when a worker is respawned)
+        self.free_slots = None
+        self.slots = None         # Shared SlotTable: authoritative slot ownership
+        self.frames_done = None   # Wakes the consumer when a worker finishes a frame
+        self.stop_event = self.ctx.Event()
+        self.done_event = self.ctx.Event()  # Set by the consumer once every frame is written
         self.input_shm = None
         self.output_shm = None
-        self.shared_frame_count = None
+        self.counters = None      # Lock-free progress counter block (see core.progress)
+        self.progress = None
+        self.subscribers = []
+        self.last_publish = 0
+        self.skip_stats = None
+        self.roi = None           # Bound RegionSpec for ROI jobs
+        self.profile_dir = None   # Per-run profile output (None: not profiling)
+
+        # Fault isolation: worker id -> process; frames waiting for a worker
+        self.workers = []
+        self.worker_args = None
+        self.worker_kwargs = None
+        self.consumer = None
+        self.placement_plan = None
+        self.slot_nodes = None      # 'numa': home node per ring slot
+        self.worker_nodes = []
+        self.memory_plan = None
+        self.backlog = collections.deque()
+        self.table_lock = threading.Lock()  # Dispatcher vs. recovery/watchdog
+        self.next_token = 0
+        self.frame_retries = {}
+        self.max_retries = 2
+        self.respawns_left = 0
+        self.dropped_frames = []
+        self.stall_timeout = 5.0
+        self.last_completed = 0
+        self.last_progress_time = 0
+        self.error = None         # Why the last run ended early (None if it did not)
+        self.monitor_thread = None
+        self.dispatch_thread = None
+        self.workers_ready = None
         
         self.is_running = False
+        self.starting = False     # True while start() is running
         self.start_time = 0
-        self.last_fps_check_time = 0
-        self.last_frame_count = 0
-        self.current_fps = 0.0
         
-    def start(self, video_path, output_path, worker_count, buffer_size, effects):
-        self.stop()
+    def start(self, video_path, output_path, worker_count, buffer_size, effects,
+              change_threshold=None, tile_size=32, max_retries=2,
+              placement="none", huge_pages=False, memory_budget=None, roi=None, profile=None):
+        # check_health() reports True throughout: forkserver's first start()
+        # blocks while it preloads, and pollers must not read that as finished
+        self.starting = True
+        try:
+            self.stop()
+            # Release shared memory even if the host app exits without calling stop().
+            # Registered per run and removed by stop(), so finished engines can be collected.
+            atexit.register(self.stop)
+            policy = PlacementPolicy(placement, huge_pages=huge_pages)
+            from core.pipeline import build_pipeline
+            from core.workers import producer_task, consumer_task
+
+            # Validate the effect list / graph spec before allocating anything
+            pipeline = build_pipeline(effects)
+
+            # 1. "TRUE SHAPE" DETECTION (Fixes Glitches)
+            info = self.probe(video_path)
+            shape, fps = info["shape"], info["fps"]
+
+            # Regions of interest (rects, per-frame rects or a mask; see core.roi)
+            self.roi = None
+            if roi is not None:
+                from core.roi import load_roi
+                self.roi = load_roi(roi).bind(shape)
+                halo = "whole frame" if pipeline.halo is None else f"{pipeline.halo} px"
+                logging.info(f"ROI: {len(self.roi.rects)} default region(s) covering {self.roi.coverage():.1%} of the frame, halo {halo}")
+                if change_threshold is not None:
+                    logging.warning("Change detection is ignored for ROI jobs")
+                    change_threshold = None
+
+            # 2. MEMORY BUDGET (Ring depth from the real frame size)
+            budget = memory_budget or MemoryBudget()
+            scratch_frames = 3 + (2 if change_threshold is not None else 0)
+            self.memory_plan = budget.plan(int(np.prod(shape)), buffer_size, worker_count, scratch_frames=scratch_frames)
+            logging.info(self.memory_plan.summary())
+            buffer_size = self.memory_plan.slots
+        
+            # 3. SETUP QUEUES
+            self.input_queue = self.ctx.Queue(maxsize=1000)
+            # Ring slots are handed producer -> worker -> consumer and back
+            self.free_slots = self.ctx.Queue()
+            for slot_idx in range(buffer_size):
+                self.free_slots.put(slot_idx)
+            self.slots = SlotTable(self.ctx.Array('q', SlotTable.cells(buffer_size), lock=False))
+            self.frames_done = self.ctx.Semaphore(0)
+            self.backlog = collections.deque()
+            self.task_queues = [None] * worker_count
+            self.next_token = 0
+            self.frame_retries = {}
+            self.max_retries = max_retries
+            self.respawns_left = 4 * worker_count
+            self.dropped_frames = []
+            self.error = None
+            self.counters = self.ctx.Array('q', counter_cells(worker_count), lock=False)
+            self.counters[TOTAL] = max(0, info["frame_count"])
+            # [frames_seen, frames_reused, tiles_skipped, tiles_total]
+            self.skip_stats = self.ctx.Array('q', 4)
+            self.stop_event.clear()
+            self.done_event.clear()
         
-        # 1. SETUP QUEUES
-        self.input_queue = multiprocessing.Queue(maxsize=1000)
-        self.output_queue = multiprocessing.Queue(maxsize=1000)
-        self.shared_frame_count = multiprocessing.Value('i', 0)
-        self.stop_event.clear()
+            self.start_time = time.time()
+            self.last_completed = 0
+            self.last_progress_time = self.start_time
+            self.progress = ProgressTracker(self.counters, worker_count)
+
+            # 4. ALLOCATE MEMORY (Exact Fit, unique per run)
+            reclaim_orphaned_segments()
+            self.input_shm = SharedMemoryBuffer(make_segment_name("in"), shape, count=buffer_size, huge_pages=huge_pages)
+            if not self.input_shm.allocate(): raise Exception("Failed to alloc Input SHM")
         
-        self.is_running = True
-        self.start_time = time.time()
-        self.last_fps_check_time = time.time()
-        self.last_frame_count = 0
+            self.output_shm = SharedMemoryBuffer(make_segment_name("out"), shape, count=buffer_size, huge_pages=huge_pages)
+            if not self.output_shm.allocate():
+                self.input_shm.close()
+                raise Exception("Failed to alloc Output SHM")
+            in_name, out_name = self.input_shm.name, self.output_shm.name
 
-        # 2. "TRUE SHAPE" DETECTION (Fixes Glitches)
+            # 5. SPAWN PROCESSES (workers first so they can first-touch their slots)
+            if profile:
+                # One subdirectory per run so merges never mix runs (the pid and random
+                # suffix keep runs started in the same second, or by other engines, apart)
+                self.profile_dir = os.path.join(profile, time.strftime("run-%Y%m%d-%H%M%S") + f"-{os.getpid()}-{uuid.uuid4().hex[:6]}")
+                logging.info(f"Profiling children into {self.profile_dir}")
+            self.placement_plan = policy.plan(worker_count, buffer_size)
+            self.slot_nodes = self.placement_plan["slot_nodes"]
+            self.worker_nodes = [w["node"] for w in self.placement_plan["workers"]]
+            # Held on the engine: under spawn/forkserver the semaphore is unlinked once
+            # unreferenced, which can be before a child has unpickled it
+            self.workers_ready = workers_ready = self.ctx.Semaphore(0)
+            self.worker_args = (in_name, out_name, shape, buffer_size)
+            self.worker_kwargs = {"active_effects": pipeline.spec, "change_threshold": change_threshold, "tile_size": tile_size,
+                                  "skip_stats": self.skip_stats, "counters": self.counters, "roi": self.roi}
+            self.workers = []
+            for worker_id in range(worker_count):
+                self.workers.append(self._spawn_worker(worker_id, first_start=True, ready=workers_ready))
+
+            if policy.name == "numa":
+                # Producer must not write a slot before its owner has touched it
+                for _ in range(worker_count):
+                    if not workers_ready.acquire(timeout=10.0):
+                        logging.warning("Timed out waiting for workers to first-touch the ring")
+                        break
+
+            p_prod = self._process(
+                "producer", producer_task,
+                args=(video_path, in_name, shape, buffer_size, self.input_queue, self.free_slots, self.slots, self.stop_event, self.counters),
+                kwargs={"cpus": self.placement_plan["producer"]}
+            )
+            p_prod.start()
+            self.procs.append(p_prod)
+
+            p_cons = self._process(
+                "consumer", consumer_task,
+                args=(output_path, out_name, shape, buffer_size, self.slots, self.frames_done, self.free_slots, self.stop_event, self.done_event,
+                      fps, self.counters, self.placement_plan["consumer"]),
+                kwargs={"input_shm_name": in_name, "roi": self.roi}
+            )
+            p_cons.start()
+            self.procs.append(p_cons)
+            self.consumer = p_cons
+
+            # 6. DISPATCH AND SUPERVISE WORKERS
+            self.dispatch_thread = threading.Thread(target=self._dispatch_frames, daemon=True)
+            self.dispatch_thread.start()
+            self.monitor_thread = threading.Thread(target=self._monitor_workers, daemon=True)
+            self.monitor_thread.start()
+            self.is_running = True
+            return True
+        finally:
+            self.starting = False
+
+    @staticmethod
+    def probe(video_path):
+        """Returns {"shape", "fps", "frame_count"} for a video, trusting decoded pixels over metadata."""
+        import cv2
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened(): raise Exception("Could not open video file.")
         
         # Read the first frame to get ACTUAL dimensions (Trust pixel data, not metadata)
         ret, first_frame = cap.read()
-        if not ret: raise Exception("Could not read first video frame.")
+        if not ret:
+            cap.release()
+            raise Exception("Could not read first video frame.")
         
         true_height, true_width = first_frame.shape[:2]
-        
         fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         cap.release() # Close it, the producer will re-open it
         
-        shape = (true_height, true_width, 3) 
+        return {"shape": (true_height, true_width, 3), "fps": fps, "frame_count": frame_count}
 
-        # 3. ALLOCATE MEMORY (Exact Fit)
-        self.input_shm = SharedMemoryBuffer("shm_in", shape, count=buffer_size)
-        if not self.input_shm.allocate(): 
-            self.input_shm.close()
-            if not self.input_shm.allocate(): raise Exception("Failed to alloc Input SHM")
-        
-        self.output_shm = SharedMemoryBuffer("shm_out", shape, count=buffer_size)
-        if not self.output_shm.allocate(): 
-            self.output_shm.close()
-            if not self.output_shm.allocate(): raise Exception("Failed to alloc Output SHM")
-
-        # 4. SPAWN PROCESSES
-        p_prod = multiprocessing.Process(target=producer_task, args=(video_path, "shm_in", shape, buffer_size, self.input_queue, self.stop_event))
-        p_prod.start()
-        self.procs.append(p_prod)
-
-        for _ in range(worker_count):
-            p_work = multiprocessing.Process(target=worker_task, args=("shm_in", "shm_out", shape, buffer_size, self.input_queue, self.output_queue, self.stop_event, effects))
-            p_work.start()
-            self.procs.append(p_work)
-
-        p_cons = multiprocessing.Process(
-            target=consumer_task, 
-            args=(output_path, "shm_out", shape, buffer_size, self.output_queue, self.stop_event, fps, worker_count, self.shared_frame_count)
-        )
-        p_cons.start()
-        self.procs.append(p_cons)
-        
-        return True
+    def _process(self, role, target, args=(), kwargs=None):
+        """Creates a child process, wrapped in the profiler when this run is profiled."""
+        if self.profile_dir:
+            args = (role, self.profile_dir, target) + tuple(args)
+            target = profiled
+        return self.ctx.Process(target=target, args=args, kwargs=kwargs or {})
+
+    def _spawn_worker(self, worker_id, first_start=False, ready=None):
+        placement = dict(self.placement_plan["workers"][worker_id])
+        if not first_start:
+            placement["touch_slots"] = None # Ring is already faulted in
+        from core.workers import worker_task
+        # A fresh queue per process: a worker killed inside get() can leave its
+        # queue's lock held, so the old one is never read again
+        old_queue = self.task_queues[worker_id]
+        if old_queue is not None:
+            old_queue.cancel_join_thread()
+            old_queue.close()
+        task_queue = self.task_queues[worker_id] = self.ctx.Queue()
+        p_work = self._process("worker", worker_task,
+                               args=self.worker_args + (task_queue, self.slots, self.frames_done, self.stop_event, self.done_event),
+                               kwargs=dict(self.worker_kwargs, worker_id=worker_id, placement=placement, ready=ready))
+        p_work.start()
+        self.procs.append(p_work)
+        return p_work
+
+    def _dispatch_frames(self):
+        """Moves decoded frames from the producer to the least-loaded live worker's own queue."""
+        while not self.stop_event.is_set() and not self.done_event.is_set():
+            try:
+                if not self.backlog:
+                    self.backlog.append(self.input_queue.get(timeout=0.1))
+                while True:
+                    self.backlog.append(self.input_queue.get_nowait())
+            except queue.Empty:
+                if not self.backlog:
+                    continue
+            dispatched = False
+            with self.table_lock:
+                load = self._worker_load()
+                alive = [w for w, proc in enumerate(self.workers) if proc.is_alive()]
+                # Oldest first, but a slot whose node is saturated does not hold up the others
+                for position, (slot_idx, frame_idx) in enumerate(self.backlog):
+                    worker_id = self._pick_worker(load, alive, slot_idx)
+                    if worker_id is None:
+                        if self.slot_nodes is None:
+                            break
+                        continue
+                    del self.backlog[position]
+                    # Skip duplicates (e.g. a watchdog re-dispatch that already went out)
+                    if self.slots.get(slot_idx, FRAME) == frame_idx and self.slots.get(slot_idx, STATE) == READY:
+                        self.next_token += 1
+                        self.slots.assign(slot_idx, worker_id, self.next_token)
+                        self.task_queues[worker_id].put((slot_idx, frame_idx, self.next_token))
+                    dispatched = True
+                    break
+            if not dispatched:
+                self.stop_event.wait(0.002)
+
+    def _worker_load(self):
+        load = [0] * len(self.workers)
+        for _, _, state, owner, _ in self.slots.rows():
+            if state in (QUEUED, CLAIMED) and 0 <= owner < len(load):
+                load[owner] += 1
+        return load
+
+    def _pick_worker(self, load, alive, slot_idx):
+        """
+        Least-loaded live worker with prefetch room. Under 'numa' only workers
+        on the slot's home node qualify, unless that node has no live worker.
+        """
+        if self.slot_nodes is not None:
+            home = [w for w in alive if self.worker_nodes[w] == self.slot_nodes[slot_idx]]
+            alive = home or alive
+        candidates = [w for w in alive if load[w] < WORKER_PREFETCH]
+        return min(candidates, key=load.__getitem__) if candidates else None
+
+    def _monitor_workers(self):
+        while not self.stop_event.wait(0.2):
+            try:
+                self._recover_workers()
+                self._watch_stalls()
+                self._check_consumer()
+                self._publish_progress()
+            except Exception as e:
+                logging.error(f"Worker supervision failed: {e}")
+
+    def _publish_progress(self, interval=0.5):
+        if not self.subscribers or time.time() - self.last_publish < interval:
+            return
+        self.last_publish = time.time()
+        snapshot = self.progress.snapshot()
+        for callback in list(self.subscribers):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logging.warning(f"Progress subscriber failed: {e}")
+
+    def subscribe(self, callback):
+        """
+        Calls `callback(ProgressSnapshot)` about twice a second while running.
+        Callbacks run on the engine's monitor thread (GUIs must marshal to their own thread).
+        """
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def _recover_workers(self):
+        """Respawns dead workers and re-dispatches every frame each one was holding."""
+        with self.table_lock:
+            for worker_id, proc in enumerate(self.workers):
+                if proc.is_alive() or self.stop_event.is_set() or self.done_event.is_set():
+                    continue
+
+                # The table, not the worker's queue, says what it held
+                for slot_idx, frame_idx, state, owner, _ in self.slots.rows():
+                    if owner != worker_id or state not in (QUEUED, CLAIMED):
+                        continue
+                    if state == CLAIMED:
+                        retries = self.frame_retries.get(frame_idx, 0) + 1
+                        self.frame_retries[frame_idx] = retries
+                        if retries > self.max_retries:
+                            # Poison frame: let the consumer skip it and reclaim the slot
+                            logging.error(f"Frame {frame_idx} failed {retries} times; dropping it")
+                            self.dropped_frames.append(frame_idx)
+                            self.slots.set_state(slot_idx, SLOT_DROPPED)
+                            self.frames_done.release()
+                            continue
+                        logging.warning(f"Worker {worker_id} died (exit {proc.exitcode}); re-dispatching frame {frame_idx} (retry {retries})")
+                    # Queued-but-unclaimed frames go back without a retry penalty
+                    self.slots.set_state(slot_idx, READY)
+                    self.backlog.appendleft((slot_idx, frame_idx))
+
+                # A dead worker holds nothing. Its counters may be one apart whichever
+                # line it died on, so settle them before the respawn (their only writer) starts.
+                self.counters[claimed_cell(worker_id)] = self.counters[processed_cell(worker_id)]
+
+                if self.respawns_left <= 0:
+                    self._fail(f"Worker {worker_id} died (exit {proc.exitcode}) and the respawn limit was reached")
+                    return
+                self.respawns_left -= 1
+                self.procs.remove(proc)
+                self.workers[worker_id] = self._spawn_worker(worker_id)
+                logging.warning(f"Worker {worker_id} respawned as PID {self.workers[worker_id].pid}")
+
+    def _watch_stalls(self):
+        """Re-dispatches the consumer's next frame if output stalls while no worker holds it."""
+        completed = self.counters[WRITTEN] + self.counters[DROPPED]
+        now = time.time()
+        if completed != self.last_completed:
+            self.last_completed, self.last_progress_time = completed, now
+            return
+        if now - self.last_progress_time < self.stall_timeout:
+            return
+        self.last_progress_time = now   # Give a re-dispatch time to land before the next attempt
+        with self.table_lock:
+            for slot_idx, frame_idx, state, _, _ in self.slots.rows():
+                # Only READY rows: a QUEUED row's worker may be mid-claim() and owns
+                # the row until it dies (then _recover_workers takes it back)
+                if frame_idx == completed and state == READY:
+                    logging.warning(f"Output stalled on frame {frame_idx}; re-dispatching it")
+                    self.backlog.appendleft((slot_idx, frame_idx))
+
+    def _check_consumer(self):
+        if self.consumer is not None and not self.consumer.is_alive() and not self.done_event.is_set():
+            self._fail(f"Consumer exited (exit {self.consumer.exitcode}) before writing every frame")
+
+    def _fail(self, message):
+        """Ends the run early; `error` tells callers the output is incomplete."""
+        self.error = message
+        logging.error(message)
+        self.stop_event.set()
 
     def stop(self):
         self.stop_event.set()
+        for thread in (self.monitor_thread, self.dispatch_thread):
+            if thread and thread is not threading.current_thread():
+                thread.join(timeout=1.0)
+        self.monitor_thread = None
+        self.dispatch_thread = None
+        # Profiled children write their stats on the way out, so give them longer
+        join_timeout = 5.0 if self.profile_dir else 0.1
         for p in self.procs:
-            p.join(timeout=0.1)
+            p.join(timeout=join_timeout)
         for p in self.procs:
             if p.is_alive(): p.terminate() 
+        if self.profile_dir:
+            for p in self.procs:
+                p.join(timeout=5.0)
+            report = merge_profiles(self.profile_dir)
+            if report:
+                logging.info(f"Profile report: {report} (timeline: trace.json)")
+            self.profile_dir = None
+        for task_queue in self.task_queues:
+            if task_queue is not None:
+                task_queue.cancel_join_thread()
         self.procs = []
+        self.workers = []
+        self.task_queues = []
+        self.consumer = None
         if self.input_shm: self.input_shm.close()
         if self.output_shm: self.output_shm.close()
         self.is_running = False
+        atexit.unregister(self.stop)
 
     def check_health(self):
+        if self.starting: return True
         if not self.is_running: return False
         if self.procs:
             alive_count = sum(1 for p in self.procs if p.is_alive())
@@ -102,17 +453,25 @@ class VideoEngine:
         return False
 
     def get_progress(self):
+        """Returns (elapsed, smoothed fps, frames written)."""
         if not self.is_running: return 0, 0, 0
-        elapsed = time.time() - self.start_time
-        
-        now = time.time()
-        delta_time = now - self.last_fps_check_time
-        current_count = self.shared_frame_count.value
-        delta_frames = current_count - self.last_frame_count
-        
-        if delta_time > 0.5:
-            self.current_fps = delta_frames / delta_time
-            self.last_fps_check_time = now
-            self.last_frame_count = current_count
-            
-        return elapsed, self.current_fps, current_count
\ No newline at end of file
+        snapshot = self.progress.snapshot()
+        return snapshot.elapsed, snapshot.fps, snapshot.written
+
+    def get_snapshot(self):
+        """Full progress: totals, per-stage in-flight counts, EWMA fps and ETA (None before start)."""
+        if self.progress is None: return None
+        return self.progress.snapshot()
+
+    def get_skip_stats(self):
+        """How much work the change detector avoided (all zero when disabled)."""
+        if self.skip_stats is None:
+            return {"frames_seen": 0, "frames_reused": 0, "tiles_skipped": 0, "tiles_total": 0, "work_saved": 0.0}
+        frames_seen, frames_reused, tiles_skipped, tiles_total = self.skip_stats[:]
+        return {
+            "frames_seen": frames_seen,
+            "frames_reused": frames_reused,
+            "tiles_skipped": tiles_skipped,
+            "tiles_total": tiles_total,
+            "work_saved": tiles_skipped / tiles_total if tiles_total else 0.0,
+        }
\ No newline at end of file
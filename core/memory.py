@@ -1,61 +1,186 @@
 import multiprocessing
-from multiprocessing import shared_memory
+import mmap
+import os
+import sys
+import json
+import uuid
+from pathlib import Path
+from multiprocessing import shared_memory, resource_tracker
 import numpy as np
+import psutil
 import logging
 
+# One record per live segment: lets a new engine find segments whose owner died
+REGISTRY_DIR = Path.home() / ".luminaflow" / "shm"
+
+def make_segment_name(tag):
+    """Per-run unique segment name (short enough for macOS' 31-char limit)."""
+    return f"lf_{os.getpid()}_{uuid.uuid4().hex[:8]}_{tag}"
+
+def attach_segment(name):
+    """
+    Attaches to an existing segment without registering it with this
+    process' resource tracker. Only the creating engine may unlink it;
+    a tracked attach would unlink (or warn about) it when a child exits.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    original = resource_tracker.register
+    def register(res_name, rtype):
+        if rtype != "shared_memory":
+            original(res_name, rtype)
+    resource_tracker.register = register
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = original
+
+def _owner_alive(record):
+    """True if the process that created a segment is still running (guards against PID reuse)."""
+    try:
+        proc = psutil.Process(record["pid"])
+        return abs(proc.create_time() - record["started"]) < 1.0
+    except psutil.AccessDenied:
+        # Exists but belongs to someone we may not inspect: never reclaim a live engine's rings
+        return True
+    except (psutil.NoSuchProcess, KeyError):
+        return False
+
+def reclaim_orphaned_segments():
+    """Unlinks segments left behind by crashed engines. Returns their names."""
+    reclaimed = []
+    if not REGISTRY_DIR.is_dir():
+        return reclaimed
+    for path in REGISTRY_DIR.glob("*.json"):
+        try:
+            record = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if _owner_alive(record):
+            continue
+        try:
+            # Tracked attach + unlink keeps our resource tracker balanced
+            shm = shared_memory.SharedMemory(name=record["name"])
+            shm.close()
+            shm.unlink()
+            reclaimed.append(record["name"])
+            logging.warning(f"Reclaimed orphaned shared memory '{record['name']}' (owner PID {record.get('pid')} is gone)")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Could not reclaim '{record.get('name')}': {e}")
+            continue
+        path.unlink(missing_ok=True)
+    return reclaimed
+
+def advise_huge_pages(shm):
+    """Best-effort MADV_HUGEPAGE on a SharedMemory mapping (needs shmem THP enabled)."""
+    mapping = getattr(shm, "_mmap", None)
+    if mapping is None or not hasattr(mmap, "MADV_HUGEPAGE"):
+        return False
+    try:
+        mapping.madvise(mmap.MADV_HUGEPAGE)
+        return True
+    except (OSError, ValueError) as e:
+        logging.warning(f"Huge pages unavailable for '{shm.name}': {e}")
+        return False
+
 class SharedMemoryBuffer:
     """
     Manages a Zero-Copy Shared Memory Ring Buffer.
     Allocates a single large block of RAM and creates NumPy views into it.
     """
-    def __init__(self, name, shape, dtype=np.uint8, count=30):
+    def __init__(self, name, shape, dtype=np.uint8, count=30, huge_pages=False):
         self.name = name
+        self.huge_pages = huge_pages
         self.shape = shape      # (Height, Width, Channels)
         self.dtype = dtype
         self.count = count      # Number of slots in the ring (Buffer size)
-        
+
         # Calculate size of one frame in bytes
         self.frame_nbytes = int(np.prod(shape) * np.dtype(dtype).itemsize)
         # Total size needed = frame_size * buffer_count
         self.total_size = self.frame_nbytes * count
-        
+
         self.shm = None
+        self.owner = False      # Only the creator unlinks
         self.buffers = []       # List of numpy arrays (views)
 
+    @property
+    def _record_path(self):
+        return REGISTRY_DIR / f"{self.name}.json"
+
     def allocate(self):
         """Allocates the raw memory block."""
         try:
+            # Record ownership *before* creating, so a crash can never leave an unlisted segment
+            REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+            self._record_path.write_text(json.dumps({
+                "name": self.name, "pid": os.getpid(), "started": psutil.Process().create_time(),
+                "bytes": self.total_size,
+            }))
+
             # Create shared memory block
             self.shm = shared_memory.SharedMemory(create=True, size=self.total_size, name=self.name)
-            
-            # Create numpy views for each slot
-            for i in range(self.count):
-                offset = i * self.frame_nbytes
-                # Create a numpy array that points directly to this shared memory offset
-                # ZERO-COPY MAGIC HAPPENS HERE
-                array_view = np.ndarray(
-                    self.shape, 
-                    dtype=self.dtype, 
-                    buffer=self.shm.buf, 
-                    offset=offset
-                )
-                self.buffers.append(array_view)
-                
+            self.owner = True
+            if self.huge_pages:
+                advise_huge_pages(self.shm)
+            self._create_views()
+
             logging.info(f"Shared Memory '{self.name}' allocated: {self.total_size / (1024**2):.2f} MB")
             return True
-        except FileExistsError:
-            logging.error(f"Shared memory '{self.name}' already exists. Please cleanup.")
+        except OSError as e:
+            # Includes FileExistsError: the segment is not ours, so drop our claim on it
+            logging.error(f"Could not allocate shared memory '{self.name}': {e}")
+            self._record_path.unlink(missing_ok=True)
             return False
 
+    def attach(self):
+        """Attaches to the segment from a child process. Returns False if it is gone."""
+        try:
+            self.shm = attach_segment(self.name)
+        except FileNotFoundError:
+            return False
+        self._create_views()
+        return True
+
+    def _create_views(self):
+        self.buffers = []
+        # Create numpy views for each slot
+        for i in range(self.count):
+            offset = i * self.frame_nbytes
+            # Create a numpy array that points directly to this shared memory offset
+            # ZERO-COPY MAGIC HAPPENS HERE
+            array_view = np.ndarray(
+                self.shape,
+                dtype=self.dtype,
+                buffer=self.shm.buf,
+                offset=offset
+            )
+            self.buffers.append(array_view)
+
     def close(self):
-        """Cleanup to prevent memory leaks."""
-        if self.shm:
+        """Cleanup to prevent memory leaks (safe to call more than once)."""
+        if not self.shm:
+            return
+        # Views must go first or the mapping cannot be closed
+        self.buffers = []
+        try:
+            self.shm.close()
+        except Exception as e:
+            logging.warning(f"Error closing memory: {e}")
+        if self.owner:
             try:
-                self.shm.close()
                 self.shm.unlink() # Important: This releases the RAM back to OS
                 logging.info(f"Shared Memory '{self.name}' released.")
+            except FileNotFoundError:
+                pass
             except Exception as e:
-                logging.warning(f"Error closing memory: {e}")
+                logging.warning(f"Error unlinking memory: {e}")
+            self._record_path.unlink(missing_ok=True)
+        self.shm = None
+        self.owner = False
 
     def get_buffer(self, index):
         """Retrieve the numpy array for a specific slot index."""
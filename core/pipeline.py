@@ -0,0 +1,237 @@
+import importlib
+import json
+import os
+import cv2
+import numpy as np
+from core.processors import EFFECT_REGISTRY, EffectSpec
+from core.profiling import trace
+
+SOURCE = "source"
+
+def load_pipeline_spec(path):
+    """Loads a pipeline spec from a .json or .yaml/.yml file."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path) as f:
+        if ext in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML pipeline specs require PyYAML (pip install pyyaml).")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def chain_spec(effects):
+    """Converts a flat list of effect names into a pipeline spec (unknown names are skipped)."""
+    names = [name for name in (effects or []) if name in EFFECT_REGISTRY]
+    return {"nodes": [{"id": f"{i}:{name}", "effect": name} for i, name in enumerate(names)]}
+
+class _Step:
+    """One compiled unit of work: an effect, a fused LUT run, or a blend."""
+    def __init__(self, op, node_id, inputs, fn=None, params=None, inplace=False, table=None, weights=None, cost=1):
+        self.op = op            # 'effect' | 'lut' | 'blend'
+        self.node_id = node_id
+        self.inputs = inputs
+        self.cost = cost        # EffectSpec.COSTS units per pixel
+        self.fn = fn
+        self.params = params or {}
+        self.inplace = inplace
+        self.table = table
+        self.weights = weights
+
+class Pipeline:
+    """
+    Compiled effect graph.
+    Spec format (nodes must be listed after the nodes they read from):
+
+        {
+          "plugins": ["my_filters"],               # modules that call register_effect()
+          "nodes": [
+            {"id": "edges", "effect": "Edge Detect", "params": {"low": 50, "high": 150}},
+            {"id": "mix", "blend": ["source", "edges"], "weights": [1.0, 0.4]},
+            {"id": "out", "effect": "Contrast", "input": "mix", "params": {"alpha": 1.2}}
+          ],
+          "output": "out"                          # defaults to the last node
+        }
+
+    A node's "input" defaults to the previous node ("source" for the first).
+    Consecutive LUT-capable point effects are fused into one table lookup and
+    in-place effects reuse intermediate buffers nothing else reads.
+    """
+    def __init__(self, spec):
+        self.spec = spec
+        for module in spec.get("plugins", []):
+            importlib.import_module(module)
+
+        self.steps = []
+        self.kinds = set()
+        self.cost = 0           # Per-pixel cost of the compiled steps (EffectSpec.COSTS units)
+        self.halo = 0           # Context pixels the output reads around each pixel (None: whole frame)
+        self._compile(spec.get("nodes", []), spec.get("output"))
+
+    @classmethod
+    def from_effects(cls, effects):
+        return cls(chain_spec(effects))
+
+    @property
+    def is_pointwise(self):
+        """True if every output pixel depends only on the same input pixel."""
+        return self.kinds <= {"point"}
+
+    def _compile(self, nodes, output):
+        known = {SOURCE}
+        halos = {SOURCE: 0}
+        steps = []
+        prev = SOURCE
+        for node in nodes:
+            node_id = node.get("id")
+            if not node_id or node_id in known:
+                raise ValueError(f"Pipeline node ids must be unique and non-empty (got '{node_id}')")
+
+            if "blend" in node:
+                inputs = list(node["blend"])
+                weights = node.get("weights") or [1.0 / len(inputs)] * len(inputs)
+                if len(weights) != len(inputs):
+                    raise ValueError(f"Node '{node_id}': blend needs one weight per input")
+                step = _Step("blend", node_id, inputs, weights=weights, cost=EffectSpec.COSTS["low"])
+                own_halo = 0
+                self.kinds.add("point")
+            else:
+                name = node.get("effect")
+                if name not in EFFECT_REGISTRY:
+                    raise ValueError(f"Node '{node_id}': unknown effect '{name}'")
+                effect = EFFECT_REGISTRY[name]
+                params = node.get("params", {})
+                inputs = [node.get("input", prev)]
+                cost = EffectSpec.COSTS[effect.cost]
+                if effect.lut:
+                    step = _Step("lut", node_id, inputs, table=effect.lut(**params), cost=cost)
+                else:
+                    step = _Step("effect", node_id, inputs, fn=effect.fn, params=params, inplace=effect.inplace, cost=cost)
+                own_halo = effect.halo_for(params)
+                self.kinds.add(effect.kind)
+
+            for src in step.inputs:
+                if src not in known:
+                    raise ValueError(f"Node '{node_id}': input '{src}' is not defined before it")
+            # Halos add up along a path; the widest input path wins
+            input_halos = [halos[src] for src in step.inputs]
+            if own_halo is None or None in input_halos:
+                halos[node_id] = None
+            else:
+                halos[node_id] = own_halo + max(input_halos)
+            known.add(node_id)
+            steps.append(step)
+            prev = node_id
+
+        self.output = output or prev
+        if self.output not in known:
+            raise ValueError(f"Pipeline output '{self.output}' is not a node")
+        self.halo = halos[self.output]
+
+        # Drop nodes that do not contribute to the output
+        needed = {self.output}
+        for step in reversed(steps):
+            if step.node_id in needed:
+                needed.update(step.inputs)
+        steps = [step for step in steps if step.node_id in needed]
+
+        self.steps = self._fuse_luts(steps)
+        # Counted after pruning and fusion: a fused LUT chain is one lookup
+        self.cost = sum(step.cost for step in self.steps)
+        self._last_use = {}
+        for i, step in enumerate(self.steps):
+            for src in step.inputs:
+                self._last_use[src] = i
+
+    def _fuse_luts(self, steps):
+        """Folds chains of LUT steps (with a single reader) into one table."""
+        readers = {}
+        for step in steps:
+            for src in step.inputs:
+                readers[src] = readers.get(src, 0) + 1
+
+        fused = []
+        by_id = {}
+        for step in steps:
+            src = step.inputs[0]
+            parent = by_id.get(src)
+            if (step.op == "lut" and parent is not None and parent.op == "lut"
+                    and readers.get(src) == 1 and src != self.output):
+                # parent(x) then step(x) == step.table[parent.table[x]]
+                parent.table = step.table[parent.table]
+                parent.node_id = step.node_id
+                by_id.pop(src)
+                by_id[step.node_id] = parent
+                continue
+            by_id[step.node_id] = step
+            fused.append(step)
+        return fused
+
+    def run(self, frame, out=None, frame_idx=None):
+        """
+        Runs the graph on `frame` (never modified). If `out` is given the
+        result is written into it (directly via dst= where possible).
+        `frame_idx` only labels the per-effect trace spans.
+        """
+        buffers = {SOURCE: frame}
+        owned = set()   # Buffers this run allocated and may overwrite
+        result = frame
+        last = len(self.steps) - 1
+        for i, step in enumerate(self.steps):
+            src = buffers[step.inputs[0]]
+            reusable = step.inputs[0] in owned and self._last_use.get(step.inputs[0]) == i
+            dst = None
+            if i == last and out is not None:
+                dst = out
+            elif reusable:
+                dst = src
+
+            with trace(step.node_id, frame_idx):
+                if step.op == "lut":
+                    result = cv2.LUT(src, step.table, dst=dst)
+                elif step.op == "blend":
+                    result = self._blend([buffers[name] for name in step.inputs], step.weights, dst)
+                elif step.inplace:
+                    result = step.fn(src, dst=dst, **step.params)
+                else:
+                    result = step.fn(src, **step.params)
+
+            # Effects fall back to returning their input on error, so only
+            # claim ownership of genuinely new buffers
+            if not np.may_share_memory(result, frame) and all(result is not buf for buf in buffers.values()):
+                owned.add(step.node_id)
+            buffers[step.node_id] = result
+            # Release inputs nothing later reads
+            for name in step.inputs:
+                if name != SOURCE and self._last_use.get(name) == i:
+                    buffers.pop(name, None)
+
+        if out is not None:
+            if result is not out:
+                np.copyto(out, result)
+            return out
+        # An empty graph returns the input itself; callers must not mutate it
+        return result
+
+    @staticmethod
+    def _blend(frames, weights, dst=None):
+        if len(frames) == 2:
+            return cv2.addWeighted(frames[0], weights[0], frames[1], weights[1], 0, dst=dst)
+        acc = np.zeros(frames[0].shape, dtype=np.float32)
+        for frame, weight in zip(frames, weights):
+            acc += frame.astype(np.float32) * weight
+        result = np.clip(acc, 0, 255).astype(np.uint8)
+        if dst is not None:
+            np.copyto(dst, result)
+            return dst
+        return result
+
+def build_pipeline(effects):
+    """Accepts a list of effect names, a spec dict, or a path to a spec file."""
+    if isinstance(effects, Pipeline):
+        return effects
+    if isinstance(effects, str):
+        return Pipeline(load_pipeline_spec(effects))
+    if isinstance(effects, dict):
+        return Pipeline(effects)
+    return Pipeline.from_effects(effects)
\ No newline at end of file
@@ -0,0 +1,135 @@
+import os
+import glob
+import logging
+
+POLICIES = ("none", "compact", "numa")
+
+def _parse_cpulist(text):
+    """Parses a sysfs cpulist such as '0-3,8-11' into a list of ints."""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part: continue
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def available_cpus():
+    """CPUs this process may run on (respects cgroup/taskset limits)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def numa_nodes():
+    """Returns {node_id: [cpus]} from sysfs, or a single node if unavailable."""
+    allowed = set(available_cpus())
+    nodes = {}
+    for path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*/cpulist")):
+        node_id = int(os.path.basename(os.path.dirname(path))[4:])
+        try:
+            with open(path) as f:
+                cpus = [c for c in _parse_cpulist(f.read()) if c in allowed]
+        except OSError:
+            continue
+        if cpus:
+            nodes[node_id] = cpus
+    return nodes or {0: sorted(allowed)}
+
+def _split(cpus, parts):
+    """Splits a CPU list into `parts` contiguous chunks (sharing CPUs if too few)."""
+    if parts <= 0: return []
+    if len(cpus) < parts:
+        return [[cpus[i % len(cpus)]] for i in range(parts)]
+    size, extra = divmod(len(cpus), parts)
+    chunks, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(cpus[start:end])
+        start = end
+    return chunks
+
+def pin_current_process(cpus):
+    """Restricts the calling process to `cpus` (no-op where unsupported)."""
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError as e:
+        logging.warning(f"Could not pin PID {os.getpid()} to {cpus}: {e}")
+
+class PlacementPolicy:
+    """
+    Decides where the producer, workers and consumer run.
+    - none:    OS scheduling, OpenCV keeps its default thread pool (baseline).
+    - compact: Producer/consumer get their own core, workers split the rest.
+    - numa:    Workers are spread evenly across NUMA nodes and first-touch
+               their share of the ring slots so pages live on their node.
+               Each slot then has a home node, and the engine dispatches it
+               only to workers on that node. The producer's decode write and
+               the consumer's read still cross nodes once per frame.
+    """
+    def __init__(self, name="none", huge_pages=False):
+        if name not in POLICIES:
+            raise ValueError(f"Unknown placement policy '{name}'. Choose from {POLICIES}.")
+        self.name = name
+        self.huge_pages = huge_pages  # Ask for transparent huge pages on the rings
+
+    def plan(self, worker_count, buffer_count):
+        """
+        Returns a dict: {"producer": cpus, "consumer": cpus, "workers": [
+        {"cpus": [...], "threads": n, "touch_slots": (start, stop) | None,
+        "node": node_id | None, "huge_pages": bool}, ...],
+        "slot_nodes": [home node per ring slot] | None}.
+        """
+        no_pin = {"cpus": None, "threads": None, "touch_slots": None, "node": None, "huge_pages": self.huge_pages}
+        if self.name == "none":
+            return {"producer": None, "consumer": None, "workers": [dict(no_pin) for _ in range(worker_count)],
+                    "slot_nodes": None}
+
+        cpus = available_cpus()
+        nodes = numa_nodes()
+
+        # Reserve I/O cores only when there are enough to go around
+        io_cpus = []
+        if len(cpus) >= worker_count + 2:
+            io_cpus = [cpus[0], cpus[-1]]
+
+        if self.name == "compact":
+            worker_cpus = _split([c for c in cpus if c not in io_cpus], worker_count)
+            touch = [None] * worker_count
+            worker_nodes = [None] * worker_count
+            slot_nodes = None
+        else:
+            # Distribute workers over nodes in proportion to node size
+            node_ids = sorted(nodes)
+            counts = [len(nodes[n]) * worker_count // len(cpus) for n in node_ids]
+            for i in range(worker_count - sum(counts)):
+                counts[i % len(counts)] += 1
+
+            worker_cpus, worker_nodes = [], []
+            for node_id, count in zip(node_ids, counts):
+                node_cpus = [c for c in nodes[node_id] if c not in io_cpus] or nodes[node_id]
+                worker_cpus.extend(_split(node_cpus, count))
+                worker_nodes.extend([node_id] * count)
+
+            # Each worker first-touches an equal share of the ring, which makes
+            # its node the home of those slots
+            bounds = [buffer_count * i // worker_count for i in range(worker_count + 1)]
+            touch = [(bounds[i], bounds[i + 1]) for i in range(worker_count)]
+            slot_nodes = [None] * buffer_count
+            for (start, stop), node_id in zip(touch, worker_nodes):
+                slot_nodes[start:stop] = [node_id] * (stop - start)
+
+        workers = [
+            {"cpus": worker_cpus[i], "threads": max(1, len(worker_cpus[i])), "touch_slots": touch[i],
+             "node": worker_nodes[i], "huge_pages": self.huge_pages}
+            for i in range(worker_count)
+        ]
+        return {
+            "producer": [io_cpus[0]] if io_cpus else None,
+            "consumer": [io_cpus[1]] if io_cpus else None,
+            "workers": workers,
+            "slot_nodes": slot_nodes,
+        }
\ No newline at end of file
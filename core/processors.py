@@ -9,41 +9,42 @@ class VideoEffects:
     """
     
     @staticmethod
-    def apply_denoise(frame):
+    def apply_denoise(frame, ksize=5, sigma=0):
         try:
-            return cv2.GaussianBlur(frame, (5, 5), 0)
+            return cv2.GaussianBlur(frame, (ksize, ksize), sigma)
         except Exception as e:
             logging.error(f"Denoise failed: {e}")
             return frame
 
     @staticmethod
-    def apply_sharpen(frame):
+    def apply_sharpen(frame, strength=1.0):
         try:
-            kernel = np.array([[0, -1, 0], [-1, 5,-1], [0, -1, 0]])
+            s = strength
+            kernel = np.array([[0, -s, 0], [-s, 4 * s + 1, -s], [0, -s, 0]])
             return cv2.filter2D(frame, -1, kernel)
         except Exception:
             return frame
 
     @staticmethod
-    def apply_edge_detect(frame):
+    def apply_edge_detect(frame, low=100, high=200):
         try:
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            edges = cv2.Canny(gray, 100, 200)
+            edges = cv2.Canny(gray, low, high)
             return cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
         except Exception:
             return frame
 
     @staticmethod
-    def apply_hdr(frame):
+    def apply_hdr(frame, sigma_s=12, sigma_r=0.15):
         try:
-            return cv2.detailEnhance(frame, sigma_s=12, sigma_r=0.15)
+            return cv2.detailEnhance(frame, sigma_s=sigma_s, sigma_r=sigma_r)
         except Exception:
             return frame
 
     @staticmethod
-    def apply_contrast(frame):
+    def apply_contrast(frame, alpha=1.5, beta=0, dst=None):
         try:
-            return cv2.convertScaleAbs(frame, alpha=1.5, beta=0)
+            return cv2.convertScaleAbs(frame, dst, alpha=alpha, beta=beta)
         except Exception:
             return frame
 
@@ -68,18 +69,18 @@ class VideoEffects:
             return frame
 
     @staticmethod
-    def apply_invert(frame):
+    def apply_invert(frame, dst=None):
         try:
-            return cv2.bitwise_not(frame)
+            return cv2.bitwise_not(frame, dst=dst)
         except Exception:
             return frame
 
     @staticmethod
-    def apply_sketch(frame):
+    def apply_sketch(frame, blur=21):
         try:
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             inverted = cv2.bitwise_not(gray)
-            blurred = cv2.GaussianBlur(inverted, (21, 21), 0)
+            blurred = cv2.GaussianBlur(inverted, (blur, blur), 0)
             inverted_blurred = cv2.bitwise_not(blurred)
             sketch = cv2.divide(gray, inverted_blurred, scale=256.0)
             return cv2.cvtColor(sketch, cv2.COLOR_GRAY2BGR)
@@ -87,13 +88,13 @@ class VideoEffects:
             return frame
 
     @staticmethod
-    def apply_vignette(frame):
+    def apply_vignette(frame, sigma_scale=2.5):
         try:
             rows, cols = frame.shape[:2]
             # Optimization: Calculate kernel only once if possible, 
             # but for safety we do it per frame here.
-            kernel_x = cv2.getGaussianKernel(cols, cols/2.5)
-            kernel_y = cv2.getGaussianKernel(rows, rows/2.5)
+            kernel_x = cv2.getGaussianKernel(cols, cols/sigma_scale)
+            kernel_y = cv2.getGaussianKernel(rows, rows/sigma_scale)
             kernel = kernel_y * kernel_x.T
             mask = 255 * kernel / np.linalg.norm(kernel)
             
@@ -105,16 +106,82 @@ class VideoEffects:
         except Exception:
             return frame
 
-# Dispatcher Map used by workers.py
-PROCESSOR_MAP = {
-    "Sharpen": VideoEffects.apply_sharpen,
-    "Denoise": VideoEffects.apply_denoise,
-    "Edge Detect": VideoEffects.apply_edge_detect,
-    "HDR": VideoEffects.apply_hdr,
-    "Contrast": VideoEffects.apply_contrast,
-    "Sepia": VideoEffects.apply_sepia,
-    "Emboss": VideoEffects.apply_emboss,
-    "Invert": VideoEffects.apply_invert,
-    "Sketch": VideoEffects.apply_sketch,
-    "Vignette": VideoEffects.apply_vignette
-}
\ No newline at end of file
+class EffectSpec:
+    """
+    Declares how an effect behaves so the pipeline can schedule and fuse it.
+    - kind:    'point' (per-pixel), 'local' (neighbourhood) or 'global' (whole frame).
+    - cost:    'low', 'medium' or 'high' relative per-pixel cost.
+    - inplace: The function accepts `dst=` and may write into its own input.
+    - lut:     Optional factory(**params) -> 256-entry uint8 table; consecutive
+               LUT effects are fused into a single cv2.LUT call.
+    - halo:    Pixels of context around an output pixel the effect reads (int or
+               factory(**params) -> int), used to pad ROI crops. None means the
+               whole frame; point effects default to 0.
+    """
+    KINDS = ("point", "local", "global")
+    COSTS = {"low": 1, "medium": 4, "high": 16}
+
+    def __init__(self, name, fn, kind="local", cost="medium", inplace=False, lut=None, halo=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Effect '{name}': kind must be one of {self.KINDS}")
+        if cost not in self.COSTS:
+            raise ValueError(f"Effect '{name}': cost must be one of {tuple(self.COSTS)}")
+        self.name = name
+        self.fn = fn
+        self.kind = kind
+        self.cost = cost
+        self.inplace = inplace
+        self.lut = lut
+        self.halo = 0 if halo is None and kind == "point" else halo
+
+    def halo_for(self, params):
+        """Halo in pixels for these parameters (None if unbounded)."""
+        if self.kind == "global" or self.halo is None:
+            return None
+        return int(self.halo(**params)) if callable(self.halo) else int(self.halo)
+
+# Plugin registry (name -> EffectSpec)
+EFFECT_REGISTRY = {}
+
+# Dispatcher Map used by workers.py (name -> callable, default parameters)
+PROCESSOR_MAP = {}
+
+def register_effect(name, fn=None, kind="local", cost="medium", inplace=False, lut=None, halo=None):
+    """
+    Registers an effect. Usable directly or as a decorator:
+
+        @register_effect("Posterize", kind="point", cost="low")
+        def posterize(frame, levels=4): ...
+
+    Local effects should declare a `halo` so ROI jobs can process padded
+    crops instead of whole frames, e.g. halo=lambda block=8: block.
+    """
+    def decorator(func):
+        EFFECT_REGISTRY[name] = EffectSpec(name, func, kind, cost, inplace, lut, halo)
+        PROCESSOR_MAP[name] = func
+        return func
+    if fn is not None:
+        return decorator(fn)
+    return decorator
+
+def _contrast_lut(alpha=1.5, beta=0):
+    return np.clip(np.abs(np.arange(256) * alpha + beta).round(), 0, 255).astype(np.uint8)
+
+def _invert_lut():
+    return (255 - np.arange(256)).astype(np.uint8)
+
+def _hdr_halo(sigma_s=12, sigma_r=0.15):
+    # Domain-transform filter: contributions beyond ~3 sigma_s are negligible
+    return 3 * sigma_s
+
+register_effect("Sharpen", VideoEffects.apply_sharpen, kind="local", cost="low", halo=1)
+register_effect("Denoise", VideoEffects.apply_denoise, kind="local", cost="low", halo=lambda ksize=5, sigma=0: ksize // 2)
+# Canny's hysteresis can in principle follow an edge anywhere; 8 px covers its filters and nearly all tracing
+register_effect("Edge Detect", VideoEffects.apply_edge_detect, kind="local", cost="medium", halo=8)
+register_effect("HDR", VideoEffects.apply_hdr, kind="local", cost="high", halo=_hdr_halo)
+register_effect("Contrast", VideoEffects.apply_contrast, kind="point", cost="low", inplace=True, lut=_contrast_lut)
+register_effect("Sepia", VideoEffects.apply_sepia, kind="point", cost="low")
+register_effect("Emboss", VideoEffects.apply_emboss, kind="local", cost="low", halo=1)
+register_effect("Invert", VideoEffects.apply_invert, kind="point", cost="low", inplace=True, lut=_invert_lut)
+register_effect("Sketch", VideoEffects.apply_sketch, kind="local", cost="medium", halo=lambda blur=21: blur // 2)
+register_effect("Vignette", VideoEffects.apply_vignette, kind="global", cost="medium")
\ No newline at end of file
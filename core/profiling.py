@@ -0,0 +1,193 @@
+"""
+Per-process profiling for engine runs.
+
+Each child is wrapped by `profiled()`, which runs it under cProfile and
+records per-frame spans (decode, each effect, write) in Chrome trace
+format. Spans are appended to a per-process JSON Lines file in batches, so
+memory stays flat however long the run. `merge_profiles()` combines the
+per-process files into one timeline (open trace.json in
+https://ui.perfetto.dev or chrome://tracing) and one text report.
+
+Re-merge a directory by hand with:
+    python -m core.profiling profiles/
+"""
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import signal
+import sys
+import time
+from array import array
+from contextlib import nullcontext
+
+_NULL_SPAN = nullcontext()
+
+class Tracer:
+    """
+    Collects complete ('X') trace events for this process. Disabled by default.
+    Events are buffered and appended to `path` every `batch` spans.
+    """
+    def __init__(self, batch=4096):
+        self.enabled = False
+        self.role = None
+        self.path = None
+        self.batch = batch
+        self.events = []
+
+    def open(self, role, path):
+        """Starts a trace file (header line: role and pid) and enables tracing."""
+        self.role = role
+        self.path = path
+        self.events = []
+        with open(path, "w") as f:
+            f.write(json.dumps({"role": role, "pid": os.getpid()}) + "\n")
+        self.enabled = True
+
+    def flush(self):
+        if self.events and self.path:
+            with open(self.path, "a") as f:
+                f.writelines(json.dumps(event) + "\n" for event in self.events)
+        self.events = []
+
+    def close(self):
+        self.enabled = False
+        self.flush()
+
+    def span(self, name, frame=None):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, frame)
+
+class _Span:
+    __slots__ = ("tracer", "name", "frame", "wall", "start")
+
+    def __init__(self, tracer, name, frame):
+        self.tracer = tracer
+        self.name = name
+        self.frame = frame
+
+    def __enter__(self):
+        self.wall = time.time_ns() // 1000     # Wall clock lines processes up; perf_counter times the span
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        event = {"name": self.name, "cat": self.tracer.role, "ph": "X", "ts": self.wall,
+                 "dur": (time.perf_counter_ns() - self.start) / 1000.0, "pid": os.getpid(), "tid": os.getpid()}
+        if self.frame is not None:
+            event["args"] = {"frame": self.frame}
+        self.tracer.events.append(event)
+        if len(self.tracer.events) >= self.tracer.batch:
+            self.tracer.flush()
+        return False
+
+# One tracer per process; children enable it through profiled()
+TRACER = Tracer()
+
+def trace(name, frame=None):
+    """Context manager timing one span (a shared no-op unless this process is profiled)."""
+    return TRACER.span(name, frame)
+
+def profiled(role, directory, target, *args, **kwargs):
+    """
+    Process target wrapper: runs `target` under cProfile and writes
+    <role>-<pid>.prof and <role>-<pid>.trace.jsonl into `directory`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    # terminate() must still leave a profile behind
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    stem = os.path.join(directory, f"{role}-{os.getpid()}")
+    TRACER.open(role, stem + ".trace.jsonl")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return target(*args, **kwargs)
+    finally:
+        profiler.disable()
+        TRACER.close()
+        profiler.dump_stats(stem + ".prof")
+
+def _write_events(out, lines, first):
+    """Appends JSON event lines to an open traceEvents array. Returns the new `first`."""
+    if lines:
+        out.write(("" if first else ",") + ",".join(lines))
+        first = False
+    return first
+
+def _role_of(path):
+    return os.path.basename(path).rsplit("-", 1)[0]
+
+def merge_profiles(directory, top=25):
+    """
+    Merges every per-process file in `directory` into trace.json (one
+    timeline), merged.pstats (all cProfile data) and report.txt (span
+    summary plus hot spots per role and overall). Returns the report
+    path, or None if nothing was recorded.
+    """
+    traces = sorted(glob.glob(os.path.join(directory, "*.trace.jsonl")))
+    profiles = sorted(glob.glob(os.path.join(directory, "*.prof")))
+    if not traces and not profiles:
+        return None
+
+    spans = {}      # (role, name) -> durations in ms (8 bytes each)
+    # Streamed event by event: a long run's timeline never sits in memory whole
+    with open(os.path.join(directory, "trace.json"), "w") as out_trace:
+        out_trace.write('{"displayTimeUnit": "ms", "traceEvents": [')
+        first = True
+        for path in traces:
+            try:
+                with open(path) as f:
+                    header = json.loads(f.readline())
+                    meta = {"name": "process_name", "ph": "M", "pid": header["pid"],
+                            "args": {"name": f"{header['role']} ({header['pid']})"}}
+                    lines = [json.dumps(meta)]
+                    for line in f:
+                        try:
+                            event = json.loads(line)
+                        except ValueError:
+                            break       # Torn last line of a killed process
+                        lines.append(line.rstrip("\n"))
+                        spans.setdefault((header["role"], event["name"]), array("d")).append(event["dur"] / 1000.0)
+                        if len(lines) >= 4096:
+                            first = _write_events(out_trace, lines, first)
+                            lines = []
+                    first = _write_events(out_trace, lines, first)
+            except (OSError, ValueError, KeyError):
+                continue
+        out_trace.write("]}")
+
+    out = io.StringIO()
+    out.write("Per-frame spans (ms)\n")
+    out.write(f"{'role':<10} {'span':<24} {'count':>7} {'total':>10} {'mean':>8} {'p95':>8} {'max':>8}\n")
+    for (role, name), durations in sorted(spans.items(), key=lambda item: -sum(item[1])):
+        durations = sorted(durations)
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        out.write(f"{role:<10} {name:<24} {len(durations):>7} {sum(durations):>10.1f} "
+                  f"{sum(durations) / len(durations):>8.2f} {p95:>8.2f} {durations[-1]:>8.2f}\n")
+
+    by_role = {}
+    for path in profiles:
+        by_role.setdefault(_role_of(path), []).append(path)
+    for role, paths in sorted(by_role.items()) + ([("all processes", profiles)] if len(by_role) > 1 else []):
+        out.write(f"\n=== cProfile: {role} ({len(paths)} process{'es' if len(paths) != 1 else ''}) ===\n")
+        stats = pstats.Stats(*paths, stream=out)
+        stats.strip_dirs().sort_stats("cumulative").print_stats(top)
+
+    if profiles:
+        # One combined stats file for flame/icicle viewers (e.g. `snakeviz merged.pstats`)
+        pstats.Stats(*profiles).dump_stats(os.path.join(directory, "merged.pstats"))
+
+    report_path = os.path.join(directory, "report.txt")
+    with open(report_path, "w") as f:
+        f.write(out.getvalue())
+    return report_path
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python -m core.profiling <profile-directory>")
+    report = merge_profiles(sys.argv[1])
+    print(report or f"No profiles found in {sys.argv[1]}")
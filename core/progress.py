@@ -0,0 +1,90 @@
+import math
+import threading
+import time
+
+# --- SHARED COUNTER BLOCK LAYOUT ---
+# A lock-free Array('q') where every cell has exactly one writer process,
+# so no lock is needed. The engine only reads it (plus fix-ups for dead workers).
+TOTAL = 0       # Producer (engine seeds it from CAP_PROP_FRAME_COUNT)
+DECODED = 1     # Producer
+WRITTEN = 2     # Consumer
+DROPPED = 3     # Consumer
+EOS = 4         # Producer: 1 once TOTAL is final (end of stream)
+HEADER_CELLS = 5
+
+def counter_cells(worker_count):
+    """Cells needed: header + [claimed, processed] per worker."""
+    return HEADER_CELLS + 2 * worker_count
+
+def claimed_cell(worker_id):
+    return HEADER_CELLS + 2 * worker_id
+
+def processed_cell(worker_id):
+    return HEADER_CELLS + 2 * worker_id + 1
+
+class ProgressSnapshot:
+    """Point-in-time view of a run."""
+    def __init__(self, elapsed, total, decoded, claimed, processed, written, dropped, fps):
+        self.elapsed = elapsed
+        self.total = total            # 0 if the container does not report a frame count
+        self.decoded = decoded
+        self.processed = processed
+        self.written = written
+        self.dropped = dropped
+        self.fps = fps                # EWMA-smoothed output throughput
+
+        # Frames currently held by each stage
+        self.in_flight = {
+            "queued": max(0, decoded - claimed),       # Decoded, waiting for a worker
+            "workers": max(0, claimed - processed),    # Being processed
+            "reorder": max(0, processed - written - dropped),  # Waiting for earlier frames
+        }
+
+    @property
+    def completed(self):
+        return self.written + self.dropped
+
+    @property
+    def fraction(self):
+        """0..1 progress, or None if the total is unknown."""
+        if self.total <= 0: return None
+        return min(1.0, self.completed / self.total)
+
+    @property
+    def eta(self):
+        """Seconds remaining, or None if unknown."""
+        if self.total <= 0 or self.fps <= 0: return None
+        return max(0, self.total - self.completed) / self.fps
+
+class ProgressTracker:
+    """Reads the counter block and keeps an EWMA of throughput."""
+    def __init__(self, counters, worker_count, tau=2.0):
+        self.counters = counters
+        self.worker_count = worker_count
+        self.tau = tau                # Smoothing time constant (seconds)
+        self.lock = threading.Lock()  # GUI and monitor thread both sample
+        self.start_time = time.time()
+        self.last_time = self.start_time
+        self.last_completed = 0
+        self.fps = 0.0
+
+    def snapshot(self):
+        values = self.counters[:]
+        claimed = sum(values[claimed_cell(i)] for i in range(self.worker_count))
+        processed = sum(values[processed_cell(i)] for i in range(self.worker_count))
+        completed = values[WRITTEN] + values[DROPPED]
+
+        with self.lock:
+            now = time.time()
+            dt = now - self.last_time
+            if dt >= 0.1:
+                rate = (completed - self.last_completed) / dt
+                # Time-based EWMA: independent of how often we are polled
+                alpha = 1.0 - math.exp(-dt / self.tau)
+                self.fps = rate if self.last_completed == 0 and self.fps == 0 else self.fps + alpha * (rate - self.fps)
+                self.last_time = now
+                self.last_completed = completed
+            fps = self.fps
+
+        return ProgressSnapshot(now - self.start_time, values[TOTAL], values[DECODED], claimed, processed,
+                                values[WRITTEN], values[DROPPED], fps)
\ No newline at end of file
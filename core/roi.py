@@ -0,0 +1,139 @@
+import os
+import cv2
+import numpy as np
+from core.pipeline import load_pipeline_spec
+
+MASK_EXTS = (".png", ".bmp", ".jpg", ".jpeg", ".tif", ".tiff")
+
+def _parse_rects(rects):
+    parsed = []
+    for rect in rects or []:
+        if len(rect) != 4:
+            raise ValueError(f"ROI rects are [x, y, w, h] (got {rect})")
+        parsed.append(tuple(int(v) for v in rect))
+    return parsed
+
+def _parse_frames(frames):
+    """{"12": rects, "100-200": rects} -> [(first, last, rects)] (ranges are inclusive)."""
+    parsed = []
+    for key, rects in (frames or {}).items():
+        first, _, last = str(key).partition("-")
+        parsed.append((int(first), int(last or first), _parse_rects(rects)))
+    return parsed
+
+def _clip(rects, width, height):
+    clipped = []
+    for x, y, w, h in rects:
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(width, x + w), min(height, y + h)
+        if x1 > x0 and y1 > y0:
+            clipped.append((x0, y0, x1 - x0, y1 - y0))
+    return clipped
+
+class RegionSpec:
+    """
+    Regions of interest: effects run only inside them, every other pixel
+    passes through untouched. Spec format (a bare list of rects is
+    shorthand for {"rects": [...]}):
+
+        {
+          "rects": [[x, y, w, h], ...],                 # every frame unless overridden
+          "frames": {"120": [[...]], "200-260": [[...]]},  # per frame or inclusive range
+          "mask": "watermark.png"                       # non-zero pixels only
+        }
+
+    Frames with no matching entry and no default "rects" pass through. A
+    mask without rects uses the bounding boxes of its connected regions.
+    """
+    def __init__(self, rects=None, frames=None, mask=None):
+        self.rects = _parse_rects(rects)
+        self.frames = _parse_frames(frames)
+        self.mask_path = mask
+        self.mask = None
+        self.shape = None
+
+    def bind(self, shape):
+        """Loads the mask and clips every rect to a frame of `shape`. Returns self."""
+        height, width = shape[:2]
+        if self.mask_path is not None:
+            mask = cv2.imread(self.mask_path, cv2.IMREAD_GRAYSCALE)
+            if mask is None:
+                raise ValueError(f"Could not read ROI mask '{self.mask_path}'")
+            if mask.shape != (height, width):
+                raise ValueError(f"ROI mask is {mask.shape[1]}x{mask.shape[0]}, video is {width}x{height}")
+            self.mask = mask > 0
+            if not self.rects and not self.frames:
+                _, _, stats, _ = cv2.connectedComponentsWithStats(self.mask.astype(np.uint8), connectivity=8)
+                self.rects = [tuple(int(v) for v in row[:4]) for row in stats[1:]]
+
+        self.rects = _clip(self.rects, width, height)
+        self.frames = [(first, last, _clip(rects, width, height)) for first, last, rects in self.frames]
+        self.shape = shape
+        return self
+
+    def regions_for(self, frame_idx):
+        """Rects (x, y, w, h) to process on this frame (the first matching frame entry wins)."""
+        for first, last, rects in self.frames:
+            if first <= frame_idx <= last:
+                return rects
+        return self.rects
+
+    def coverage(self):
+        """Fraction of the frame covered by the default rects (for logging)."""
+        height, width = self.shape[:2]
+        return sum(w * h for _, _, w, h in self.rects) / float(width * height)
+
+    def run(self, pipeline, frame, out, frame_idx):
+        """
+        Applies `pipeline` to each region of `frame`, writing only those pixels
+        of `out`. Each region is processed on a sub-view padded by the
+        pipeline's halo, so cost scales with region area, not frame area.
+        """
+        regions = self.regions_for(frame_idx)
+        if not regions:
+            return
+        height, width = frame.shape[:2]
+        halo = pipeline.halo
+
+        # Unbounded context (global effects): one full pass, then cut the regions out
+        if halo is None:
+            result = pipeline.run(frame, frame_idx=frame_idx)
+            for x, y, w, h in regions:
+                np.copyto(out[y:y + h, x:x + w], result[y:y + h, x:x + w])
+            return
+
+        for x, y, w, h in regions:
+            x0, y0 = max(0, x - halo), max(0, y - halo)
+            x1, y1 = min(width, x + w + halo), min(height, y + h + halo)
+            target = out[y:y + h, x:x + w]
+            if (x0, y0, x1, y1) == (x, y, x + w, y + h):
+                pipeline.run(frame[y0:y1, x0:x1], out=target, frame_idx=frame_idx)
+            else:
+                result = pipeline.run(frame[y0:y1, x0:x1], frame_idx=frame_idx)
+                np.copyto(target, result[y - y0:y - y0 + h, x - x0:x - x0 + w])
+
+    def composite(self, base, processed, frame_idx):
+        """Copies the processed regions (mask pixels only, if any) into `base`."""
+        for x, y, w, h in self.regions_for(frame_idx):
+            if self.mask is None:
+                np.copyto(base[y:y + h, x:x + w], processed[y:y + h, x:x + w])
+            else:
+                np.copyto(base[y:y + h, x:x + w], processed[y:y + h, x:x + w],
+                          where=self.mask[y:y + h, x:x + w, None])
+        return base
+
+def load_roi(source):
+    """Accepts None, a RegionSpec, a list of rects, a spec dict, a mask image or a .json/.yaml spec path."""
+    if source is None or isinstance(source, RegionSpec):
+        return source
+    if isinstance(source, str):
+        if os.path.splitext(source)[1].lower() in MASK_EXTS:
+            return RegionSpec(mask=source)
+        spec = load_pipeline_spec(source)
+        # Mask paths inside a spec file are relative to that file
+        if isinstance(spec, dict) and spec.get("mask") and not os.path.isabs(spec["mask"]):
+            spec["mask"] = os.path.join(os.path.dirname(os.path.abspath(source)), spec["mask"])
+        source = spec
+    if isinstance(source, dict):
+        return RegionSpec(source.get("rects"), source.get("frames"), source.get("mask"))
+    return RegionSpec(rects=source)
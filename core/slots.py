@@ -0,0 +1,76 @@
+"""
+Shared ring-slot table: who holds each slot and which frame is in it.
+
+Ownership moves producer -> engine dispatcher -> worker -> consumer, and
+every hand-off is a store into this table rather than a queue message,
+so a worker that dies at any point leaves an exact record behind:
+
+    FREE     in the free pool (consumer released it)
+    READY    decoded by the producer, waiting for dispatch
+    QUEUED   sent to OWNER's task queue under TOKEN
+    CLAIMED  being processed by OWNER
+    DONE     output written; the consumer may collect it
+    DROPPED  gave up after max retries; the consumer skips the frame
+
+Each cell has one writer at a time (the current holder). The engine only
+writes READY slots (to dispatch them) and slots whose owner is dead, so a
+QUEUED slot is never rewritten while its worker may be claiming it.
+"""
+FREE = 0
+READY = 1
+QUEUED = 2
+CLAIMED = 3
+DONE = 4
+DROPPED = 5
+
+FRAME, STATE, OWNER, TOKEN = range(4)
+CELLS_PER_SLOT = 4
+
+class SlotTable:
+    """View over a lock-free Array('q', CELLS_PER_SLOT * slots)."""
+    def __init__(self, array):
+        self.array = array
+        self.count = len(array) // CELLS_PER_SLOT
+
+    @staticmethod
+    def cells(slot_count):
+        return CELLS_PER_SLOT * slot_count
+
+    def get(self, slot_idx, field):
+        return self.array[CELLS_PER_SLOT * slot_idx + field]
+
+    def rows(self):
+        """Snapshot: [(slot_idx, frame, state, owner, token)] for every slot."""
+        values = self.array[:]
+        return [(i,) + tuple(values[CELLS_PER_SLOT * i:CELLS_PER_SLOT * (i + 1)]) for i in range(self.count)]
+
+    def set_state(self, slot_idx, state):
+        self.array[CELLS_PER_SLOT * slot_idx + STATE] = state
+
+    # --- Producer ---
+    def mark_ready(self, slot_idx, frame_idx):
+        base = CELLS_PER_SLOT * slot_idx
+        self.array[base + FRAME] = frame_idx
+        self.array[base + OWNER] = -1
+        self.array[base + STATE] = READY
+
+    # --- Engine dispatcher ---
+    def assign(self, slot_idx, worker_id, token):
+        base = CELLS_PER_SLOT * slot_idx
+        self.array[base + OWNER] = worker_id
+        self.array[base + TOKEN] = token
+        self.array[base + STATE] = QUEUED
+
+    # --- Worker ---
+    def claim(self, slot_idx, token):
+        """True if this dispatch is still current (re-dispatched tasks leave stale copies behind)."""
+        base = CELLS_PER_SLOT * slot_idx
+        if self.array[base + TOKEN] != token or self.array[base + STATE] != QUEUED:
+            return False
+        self.array[base + STATE] = CLAIMED
+        return True
+
+    def finish(self, slot_idx, token):
+        base = CELLS_PER_SLOT * slot_idx
+        if self.array[base + TOKEN] == token:
+            self.array[base + STATE] = DONE
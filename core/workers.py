@@ -1,49 +1,61 @@
 import time
+import functools
 import cv2
 import queue
-import multiprocessing
 import numpy as np
-from core.processors import PROCESSOR_MAP
-from core.memory import SharedMemoryBuffer 
+from core.pipeline import build_pipeline
+from core.scene import ChangeDetector
+from core.memory import SharedMemoryBuffer, attach_segment, advise_huge_pages
+from core.placement import pin_current_process
+from core.profiling import trace
+from core.progress import TOTAL, DECODED, WRITTEN, DROPPED, EOS, claimed_cell, processed_cell
+from core.slots import FREE, DONE, DROPPED as SLOT_DROPPED
 
-def producer_task(video_path, buffer_name, shape, buffer_count, 
-                  input_queue, stop_event, frame_limit=None):
+def _claim_slot(free_slots, stop_event):
+    """Blocks until a ring slot is free (returns None if stopping)."""
+    while not stop_event.is_set():
+        try:
+            return free_slots.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+def producer_task(video_path, buffer_name, shape, buffer_count,
+                  input_queue, free_slots, slots, stop_event, counters, frame_limit=None, cpus=None):
+    frame_idx = 0
     try:
+        pin_current_process(cpus)
         cap = cv2.VideoCapture(video_path)
         shm_handler = SharedMemoryBuffer(buffer_name, shape, count=buffer_count)
-        
-        try:
-            shm_handler.shm = multiprocessing.shared_memory.SharedMemory(name=buffer_name)
-        except FileNotFoundError:
+        if not shm_handler.attach():
             return
-
-        for i in range(buffer_count):
-            offset = i * shm_handler.frame_nbytes
-            shm_handler.buffers.append(
-                np.ndarray(shape, dtype=np.uint8, buffer=shm_handler.shm.buf, offset=offset)
-            )
-            
-        frame_idx = 0
-        slot_idx = 0
         
         while not stop_event.is_set():
-            ret, frame = cap.read()
-            if not ret: break
-            
-            # SAFEGUARD: Ensure frame matches expected shape EXACTLY
-            # This prevents the "slanting/glitch" effect
-            if frame.shape != shape:
-                frame = cv2.resize(frame, (shape[1], shape[0]))
-            
-            frame = np.ascontiguousarray(frame)
+            with trace("decode", frame_idx):
+                ret, frame = cap.read()
+                if not ret: break
+                
+                # SAFEGUARD: Ensure frame matches expected shape EXACTLY
+                # This prevents the "slanting/glitch" effect
+                if frame.shape != shape:
+                    frame = cv2.resize(frame, (shape[1], shape[0]))
+                
+                frame = np.ascontiguousarray(frame)
 
-            target_buffer = shm_handler.get_buffer(slot_idx)
-            np.copyto(target_buffer, frame)
+            # Slots are owned until the consumer hands them back
+            with trace("wait_slot", frame_idx):
+                slot_idx = _claim_slot(free_slots, stop_event)
+            if slot_idx is None: break
+
+            with trace("copy_in", frame_idx):
+                target_buffer = shm_handler.get_buffer(slot_idx)
+                np.copyto(target_buffer, frame)
             
+            slots.mark_ready(slot_idx, frame_idx)
             input_queue.put((slot_idx, frame_idx))
             
             frame_idx += 1
-            slot_idx = (slot_idx + 1) % buffer_count
+            counters[DECODED] = frame_idx
             
             if frame_limit and frame_idx >= frame_limit: break
 
@@ -51,100 +63,163 @@ def producer_task(video_path, buffer_name, shape, buffer_count,
     except Exception as e:
         print(f"Producer Error: {e}")
     finally:
-        input_queue.put(None) 
+        # Container metadata can be wrong; the decoded count is exact.
+        # The consumer finishes once it has written this many frames.
+        if not stop_event.is_set():
+            counters[TOTAL] = frame_idx
+            counters[EOS] = 1
 
 def worker_task(input_shm_name, output_shm_name, shape, buffer_count,
-                input_queue, output_queue, stop_event, active_effects):
+                task_queue, slots, frames_done, stop_event, done_event, active_effects,
+                change_threshold=None, tile_size=32, skip_stats=None,
+                worker_id=0, placement=None, ready=None, counters=None, roi=None):
+    detector = None
     try:
-        in_shm = multiprocessing.shared_memory.SharedMemory(name=input_shm_name)
-        out_shm = multiprocessing.shared_memory.SharedMemory(name=output_shm_name)
+        # Placement: pin before touching memory so first-touch lands on our node
+        placement = placement or {}
+        pin_current_process(placement.get("cpus"))
+        if placement.get("threads"):
+            cv2.setNumThreads(placement["threads"])
+
+        in_shm = attach_segment(input_shm_name)
+        out_shm = attach_segment(output_shm_name)
         nbytes = int(np.prod(shape) * np.dtype(np.uint8).itemsize)
+
+        if placement.get("huge_pages"):
+            advise_huge_pages(in_shm)
+            advise_huge_pages(out_shm)
+        if placement.get("touch_slots"):
+            start, stop = placement["touch_slots"]
+            for shm in (in_shm, out_shm):
+                np.ndarray((stop - start) * nbytes, dtype=np.uint8, buffer=shm.buf, offset=start * nbytes).fill(0)
+
+        # Effect list or graph spec, compiled once per worker
+        pipeline = build_pipeline(active_effects)
+
+        # Optional change detection (static content reuses previous work)
+        if change_threshold is not None and roi is None:
+            detector = ChangeDetector(change_threshold, tile_size, pipeline.is_pointwise, pipeline.cost)
+        if ready is not None:
+            ready.release()
         
-        while not stop_event.is_set():
+        # This queue is ours alone: if we die inside get(), only it breaks,
+        # and the engine replaces it when it respawns us
+        while not stop_event.is_set() and not done_event.is_set():
             try:
-                task = input_queue.get(timeout=0.1)
+                task = task_queue.get(timeout=0.1)
             except queue.Empty:
                 continue
                 
-            if task is None:
-                input_queue.put(None)
-                output_queue.put(None)
-                break
-                
-            slot_idx, frame_idx = task
+            slot_idx, frame_idx, token = task
+            # Stale copy of a frame the engine has since re-dispatched elsewhere
+            if not slots.claim(slot_idx, token):
+                continue
+            if counters is not None:
+                counters[claimed_cell(worker_id)] += 1
             offset = slot_idx * nbytes
             
             # Read-Only Input View
             input_frame = np.ndarray(shape, dtype=np.uint8, buffer=in_shm.buf, offset=offset)
             
-            # Local copy for processing (Important for safety)
-            processed = input_frame.copy()
-            
-            if active_effects:
-                for effect in active_effects:
-                    if effect in PROCESSOR_MAP:
-                        processed = PROCESSOR_MAP[effect](processed)
-            
-            # Write to Output View
+            # Write to Output View (the pipeline never modifies its input)
             output_frame = np.ndarray(shape, dtype=np.uint8, buffer=out_shm.buf, offset=offset)
-            np.copyto(output_frame, processed)
+            with trace("frame", frame_idx):
+                if roi is not None:
+                    # Only the regions are written; the consumer takes the rest from the input slot
+                    roi.run(pipeline, input_frame, output_frame, frame_idx)
+                elif detector:
+                    np.copyto(output_frame, detector.process(input_frame, functools.partial(pipeline.run, frame_idx=frame_idx)))
+                else:
+                    pipeline.run(input_frame, out=output_frame, frame_idx=frame_idx)
             
-            output_queue.put((slot_idx, frame_idx))
+            # Hand-off is the table store; the semaphore only wakes the consumer
+            slots.finish(slot_idx, token)
+            frames_done.release()
+            if counters is not None:
+                counters[processed_cell(worker_id)] += 1
+
+            if detector and skip_stats is not None:
+                detector.publish(skip_stats)
             
     except Exception as e:
         print(f"Worker Error: {e}")
 
+def open_video_writer(output_path, fps, shape):
+    """Opens a cv2.VideoWriter, trying codecs from best to most compatible."""
+    writer = None
+    # --- CODEC SELECTION ---
+    # H.264 (avc1) is smaller/better. Fallback to mp4v if missing.
+    codecs = ['avc1', 'mp4v', 'DIVX']
+    for codec in codecs:
+        try:
+            fourcc = cv2.VideoWriter_fourcc(*codec)
+            writer = cv2.VideoWriter(output_path, fourcc, fps, (shape[1], shape[0]))
+            if writer.isOpened():
+                print(f"Using codec: {codec}")
+                break
+        except:
+            continue
+    return writer
+
 def consumer_task(output_path, output_shm_name, shape, buffer_count,
-                  output_queue, stop_event, fps, total_workers, shared_frame_count):
+                  slots, frames_done, free_slots, stop_event, done_event, fps, counters, cpus=None,
+                  input_shm_name=None, roi=None):
     writer = None
     try:
-        out_shm = multiprocessing.shared_memory.SharedMemory(name=output_shm_name)
+        pin_current_process(cpus)
+        out_shm = attach_segment(output_shm_name)
+        # ROI jobs: untouched pixels come straight from the input slot
+        in_shm = attach_segment(input_shm_name) if roi is not None else None
         
-        # --- CODEC SELECTION ---
-        # H.264 (avc1) is smaller/better. Fallback to mp4v if missing.
-        codecs = ['avc1', 'mp4v', 'DIVX']
-        for codec in codecs:
-            try:
-                fourcc = cv2.VideoWriter_fourcc(*codec)
-                writer = cv2.VideoWriter(output_path, fourcc, fps, (shape[1], shape[0]))
-                if writer.isOpened():
-                    print(f"Using codec: {codec}")
-                    break
-            except:
-                continue
+        writer = open_video_writer(output_path, fps, shape)
 
         nbytes = int(np.prod(shape) * np.dtype(np.uint8).itemsize)
         
         next_frame_needed = 0
         pending_frames = {} 
-        finished_workers_count = 0
         
         while not stop_event.is_set():
-            try:
-                item = output_queue.get(timeout=0.1)
-            except queue.Empty:
-                continue
-                
-            if item is None:
-                finished_workers_count += 1
-                if finished_workers_count >= total_workers:
-                    break
-                continue
-                
-            slot_idx, frame_idx = item
-            offset = slot_idx * nbytes
-            
-            # Copy data immediately to release buffer
-            frame_data = np.ndarray(shape, dtype=np.uint8, buffer=out_shm.buf, offset=offset).copy()
-            pending_frames[frame_idx] = frame_data
+            # Woken per finished frame; the timeout also catches frames whose
+            # worker died between finishing and signalling
+            frames_done.acquire(timeout=0.05)
+
+            for slot_idx, frame_idx, state, _, _ in slots.rows():
+                if state == DONE:
+                    offset = slot_idx * nbytes
+
+                    # Copy data immediately to release buffer
+                    with trace("copy_out", frame_idx):
+                        output_frame = np.ndarray(shape, dtype=np.uint8, buffer=out_shm.buf, offset=offset)
+                        if in_shm is not None:
+                            frame_data = np.ndarray(shape, dtype=np.uint8, buffer=in_shm.buf, offset=offset).copy()
+                            roi.composite(frame_data, output_frame, frame_idx)
+                        else:
+                            frame_data = output_frame.copy()
+                    pending_frames[frame_idx] = frame_data
+                elif state == SLOT_DROPPED:
+                    # Frame was dropped after exhausting its retries
+                    pending_frames[frame_idx] = None
+                else:
+                    continue
+                slots.set_state(slot_idx, FREE)
+                free_slots.put(slot_idx)
             
             while next_frame_needed in pending_frames:
-                writer.write(pending_frames.pop(next_frame_needed))
-                with shared_frame_count.get_lock():
-                    shared_frame_count.value += 1
+                frame_data = pending_frames.pop(next_frame_needed)
+                if frame_data is not None:
+                    with trace("write", next_frame_needed):
+                        writer.write(frame_data)
+                    counters[WRITTEN] += 1
+                else:
+                    counters[DROPPED] += 1
                 next_frame_needed += 1
+
+            if counters[EOS] and next_frame_needed >= counters[TOTAL]:
+                # Every frame is out: let the workers exit
+                done_event.set()
+                break
                 
     except Exception as e:
         print(f"Consumer Error: {e}")
     finally:
-        if writer: writer.release()
\ No newline at end of file
+        if writer: writer.release()
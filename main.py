@@ -1,10 +1,17 @@
 import multiprocessing
 import sys
-from ui.app import VideoProcessingApp
+
+# NOTE: Keep module-level imports minimal. Spawned/forkserver children
+# re-import this file as __mp_main__, so the GUI stack (customtkinter,
+# matplotlib) is only imported when actually launching the app.
 
 if __name__ == "__main__":
     # Crucial for Windows multiprocessing to work correctly
     multiprocessing.freeze_support()
+
+    from utils.logger import setup_logging
+    setup_logging()
+    from ui.app import VideoProcessingApp
     
     try:
         app = VideoProcessingApp()
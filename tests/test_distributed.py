@@ -0,0 +1,110 @@
+"""
+Distributed mode on one machine: local agents on loopback, including lost nodes and refused plugins.
+"""
+import json
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("psutil")
+
+from core.distributed import MAX_MESSAGE_BYTES, Coordinator, recv_message, spawn_local_agents
+
+FRAMES = 120
+SIZE = (320, 240)
+SEGMENT = 10
+
+@pytest.fixture
+def source_video(tmp_path):
+    path = str(tmp_path / "source.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, SIZE)
+    rng = np.random.default_rng(0)
+    for _ in range(FRAMES):
+        writer.write(rng.integers(0, 256, (SIZE[1], SIZE[0], 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+@pytest.fixture
+def agents():
+    started = []
+    def start(count, **kwargs):
+        procs, addresses = spawn_local_agents(count, **kwargs)
+        started.extend(procs)
+        return procs, addresses
+    yield start
+    for proc in started:
+        proc.terminate()
+        proc.join(5)
+
+def count_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = 0
+    while cap.read()[0]:
+        frames += 1
+    cap.release()
+    return frames
+
+def kill_after_first_segment(coordinator, procs):
+    """Kills `procs` once the coordinator has written one segment (the job is then mid-run)."""
+    def watch():
+        while coordinator.next_to_write < 1:
+            time.sleep(0.01)
+        for proc in procs:
+            proc.kill()
+    thread = threading.Thread(target=watch, daemon=True)
+    thread.start()
+    return thread
+
+@pytest.mark.parametrize("node_count", [1, 3])
+def test_output_is_complete(tmp_path, source_video, agents, node_count):
+    _, addresses = agents(node_count)
+    output = str(tmp_path / "out.avi")
+    stats = Coordinator(addresses, segment_frames=SEGMENT).run(source_video, output, ["Invert"])
+
+    assert stats["frames"] == FRAMES
+    assert stats["segments"] == FRAMES // SEGMENT
+    assert stats["lost_nodes"] == []
+    assert count_frames(output) == FRAMES
+
+def test_killed_agent_loses_no_frames(tmp_path, source_video, agents):
+    procs, addresses = agents(2)
+    output = str(tmp_path / "out.avi")
+    coordinator = Coordinator(addresses, segment_frames=SEGMENT)
+    kill_after_first_segment(coordinator, procs[:1])
+    stats = coordinator.run(source_video, output, ["HDR"])
+
+    assert stats["lost_nodes"] == ["%s:%d" % addresses[0]]
+    assert stats["frames"] == FRAMES
+    assert count_frames(output) == FRAMES
+
+def test_run_raises_once_every_node_is_lost(tmp_path, source_video, agents):
+    procs, addresses = agents(2)
+    coordinator = Coordinator(addresses, segment_frames=SEGMENT)
+    kill_after_first_segment(coordinator, procs)
+    with pytest.raises(RuntimeError, match="All nodes lost"):
+        coordinator.run(source_video, str(tmp_path / "out.avi"), ["HDR"])
+
+def test_plugin_outside_allowlist_is_rejected(tmp_path, source_video, agents):
+    _, addresses = agents(1, plugins=["json"])
+    spec = {"plugins": ["os"], "nodes": [{"id": "a", "effect": "Invert"}]}
+    with pytest.raises(RuntimeError, match="Plugins not allowed on this agent: os"):
+        Coordinator(addresses, segment_frames=SEGMENT).run(source_video, str(tmp_path / "out.avi"), spec)
+
+    # Allowlisted plugins are accepted
+    spec["plugins"] = ["json"]
+    stats = Coordinator(addresses, segment_frames=SEGMENT).run(source_video, str(tmp_path / "ok.avi"), spec)
+    assert stats["frames"] == FRAMES
+
+def test_oversized_message_is_refused(agents):
+    _, addresses = agents(1)
+    with socket.create_connection(addresses[0], timeout=10) as sock:
+        # Announce more than the cap and send nothing else: the agent must hang up, not allocate
+        header = json.dumps({"type": "segment", "blobs": [MAX_MESSAGE_BYTES + 1]}).encode()
+        sock.sendall(struct.pack("!I", len(header)) + header)
+        with pytest.raises(ConnectionError):
+            recv_message(sock)
@@ -0,0 +1,148 @@
+"""
+Fault injection: SIGKILL workers mid-run and check no frame is lost or stalls.
+"""
+import os
+import queue
+import signal
+import time
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("psutil")
+pytestmark = pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs POSIX signals")
+
+from core.engine import VideoEngine
+from core.progress import WRITTEN, claimed_cell, counter_cells, processed_cell
+from core.slots import SlotTable, CLAIMED, DONE, FRAME, QUEUED, STATE, TOKEN
+
+FRAMES = 120
+SIZE = (640, 360)
+
+@pytest.fixture
+def source_video(tmp_path):
+    path = str(tmp_path / "source.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, SIZE)
+    rng = np.random.default_rng(0)
+    for _ in range(FRAMES):
+        writer.write(rng.integers(0, 256, (SIZE[1], SIZE[0], 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+def count_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = 0
+    while cap.read()[0]:
+        frames += 1
+    cap.release()
+    return frames
+
+def run_with_kills(engine, kills, interval, timeout=120):
+    """Kills a live worker every `interval` seconds, then waits for the job to end."""
+    deadline = time.time() + timeout
+    killed = 0
+    while engine.check_health():
+        assert time.time() < deadline, f"job stalled: {vars(engine.get_snapshot())}"
+        time.sleep(interval)
+        if killed < kills:
+            victim = engine.workers[killed % len(engine.workers)]
+            if victim.is_alive():
+                os.kill(victim.pid, signal.SIGKILL)
+                killed += 1
+    return killed
+
+@pytest.mark.parametrize("effects, interval", [
+    (["HDR"], 0.25),        # Workers busy: kills land mid-frame
+    (["Invert"], 0.02),     # Workers mostly idle: kills land inside the task queue's get()
+])
+def test_killed_workers_lose_no_frames(tmp_path, source_video, effects, interval):
+    output = str(tmp_path / "out.avi")
+    engine = VideoEngine()
+    engine.start(source_video, output, 3, 12, effects, max_retries=6)
+    run_with_kills(engine, kills=6, interval=interval)
+    snapshot = engine.get_snapshot()
+    engine.stop()
+
+    assert engine.error is None
+    assert snapshot.written == FRAMES
+    assert snapshot.dropped == 0
+    assert count_frames(output) == FRAMES
+    # Recovery settles each dead worker's counters, so nothing stays "in flight"
+    for worker_id in range(3):
+        assert engine.counters[claimed_cell(worker_id)] == engine.counters[processed_cell(worker_id)]
+
+def test_respawn_limit_is_reported_as_error(tmp_path, source_video):
+    engine = VideoEngine()
+    engine.start(source_video, str(tmp_path / "out.avi"), 1, 8, ["HDR"])
+    run_with_kills(engine, kills=10, interval=0.1)
+    engine.stop()
+
+    assert engine.error is not None and "respawn limit" in engine.error
+
+class _LoseOnce:
+    """Producer -> dispatcher queue that loses one frame's message, as a dying feeder thread would."""
+    def __init__(self, inner, frame_idx):
+        self.inner = inner
+        self.frame_idx = frame_idx
+        self.lost = False
+
+    def _filter(self, item):
+        if not self.lost and item[1] == self.frame_idx:
+            self.lost = True
+            raise queue.Empty
+        return item
+
+    def get(self, *args, **kwargs):
+        return self._filter(self.inner.get(*args, **kwargs))
+
+    def get_nowait(self):
+        return self._filter(self.inner.get_nowait())
+
+class _LossyEngine(VideoEngine):
+    def _dispatch_frames(self):
+        self.input_queue = _LoseOnce(self.input_queue, 10)
+        super()._dispatch_frames()
+
+def test_stall_watchdog_redispatches_unheld_frame(tmp_path, source_video):
+    output = str(tmp_path / "out.avi")
+    engine = _LossyEngine()
+    engine.stall_timeout = 0.5
+    engine.start(source_video, output, 2, 8, ["Invert"])
+    run_with_kills(engine, kills=0, interval=0.05, timeout=60)
+    snapshot = engine.get_snapshot()
+    engine.stop()
+
+    assert engine.input_queue.lost
+    assert engine.error is None
+    assert snapshot.written == FRAMES
+    assert count_frames(output) == FRAMES
+
+class _Alive:
+    def is_alive(self):
+        return True
+
+def test_stall_watchdog_leaves_live_workers_queued_rows_alone():
+    # Replays: worker A passes claim()'s token check, then the watchdog fires
+    # before A stores CLAIMED. Rewriting A's row here used to strand the frame.
+    engine = VideoEngine()
+    engine.slots = SlotTable([0] * SlotTable.cells(2))
+    engine.counters = [0] * counter_cells(2)
+    engine.workers = [_Alive(), _Alive()]
+    engine.counters[WRITTEN] = 7
+    engine.last_completed, engine.last_progress_time, engine.stall_timeout = 7, 0, 0
+
+    engine.slots.mark_ready(0, 7)
+    engine.slots.assign(0, 0, 1)
+    engine._watch_stalls()
+    assert not engine.backlog
+    assert (engine.slots.get(0, STATE), engine.slots.get(0, TOKEN)) == (QUEUED, 1)
+    assert engine.slots.claim(0, 1) and engine.slots.get(0, STATE) == CLAIMED
+    engine.slots.finish(0, 1)
+    assert engine.slots.get(0, STATE) == DONE
+
+    # A READY row nobody holds is what the watchdog re-sends
+    engine.slots.mark_ready(1, 7)
+    engine.last_progress_time = 0
+    engine._watch_stalls()
+    assert list(engine.backlog) == [(1, 7)] and engine.slots.get(1, FRAME) == 7
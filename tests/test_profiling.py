@@ -0,0 +1,37 @@
+"""
+Profiling traces stream to disk: a long run keeps a bounded buffer and still merges cleanly.
+"""
+import json
+
+from core.profiling import Tracer, merge_profiles
+
+def test_spans_are_flushed_in_batches_and_merged(tmp_path):
+    tracer = Tracer(batch=10)
+    tracer.open("worker", str(tmp_path / "worker-1.trace.jsonl"))
+    for frame_idx in range(25):
+        with tracer.span("frame", frame_idx):
+            pass
+        assert len(tracer.events) < 10
+    tracer.close()
+
+    lines = (tmp_path / "worker-1.trace.jsonl").read_text().splitlines()
+    assert json.loads(lines[0])["role"] == "worker"
+    assert [json.loads(line)["args"]["frame"] for line in lines[1:]] == list(range(25))
+
+    report = merge_profiles(str(tmp_path))
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert [e["ph"] for e in events].count("X") == 25
+    assert "frame" in open(report).read()
+
+def test_merge_skips_a_torn_last_line(tmp_path):
+    tracer = Tracer()
+    tracer.open("consumer", str(tmp_path / "consumer-2.trace.jsonl"))
+    with tracer.span("write", 0):
+        pass
+    tracer.close()
+    with open(tmp_path / "consumer-2.trace.jsonl", "a") as f:
+        f.write('{"name": "write", "du')     # Killed mid-flush
+
+    merge_profiles(str(tmp_path))
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert [e["ph"] for e in events].count("X") == 1
@@ -0,0 +1,70 @@
+"""
+Crash-safe shared memory: segments of dead engines are reclaimed, live ones never are.
+"""
+import json
+import os
+import subprocess
+import sys
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+
+import pytest
+
+psutil = pytest.importorskip("psutil")
+
+from core import memory
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory, "REGISTRY_DIR", tmp_path)
+    return tmp_path
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+def orphan_segment(registry, pid, started):
+    """A segment as a crashed engine leaves it: created, recorded, never unlinked or tracked."""
+    name = f"lf_test_{uuid.uuid4().hex[:8]}"
+    shm = shared_memory.SharedMemory(create=True, size=4096, name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    (registry / f"{name}.json").write_text(json.dumps({"name": name, "pid": pid, "started": started, "bytes": 4096}))
+    return name
+
+def exists(name):
+    try:
+        memory.attach_segment(name).close()
+        return True
+    except FileNotFoundError:
+        return False
+
+def unlink(name):
+    shm = shared_memory.SharedMemory(name=name)
+    shm.close()
+    shm.unlink()
+
+def test_dead_owner_is_reclaimed_live_owner_is_not(registry):
+    dead = orphan_segment(registry, dead_pid(), 0.0)
+    live = orphan_segment(registry, os.getpid(), psutil.Process().create_time())
+    try:
+        assert memory.reclaim_orphaned_segments() == [dead]
+        assert not exists(dead)
+        assert not (registry / f"{dead}.json").exists()
+        assert exists(live)
+        assert (registry / f"{live}.json").exists()
+    finally:
+        unlink(live)
+
+def test_uninspectable_owner_counts_as_alive(registry, monkeypatch):
+    name = orphan_segment(registry, dead_pid(), 0.0)
+
+    def access_denied(pid):
+        raise psutil.AccessDenied(pid)
+    monkeypatch.setattr(memory.psutil, "Process", access_denied)
+    try:
+        assert memory.reclaim_orphaned_segments() == []
+        assert exists(name)
+    finally:
+        unlink(name)
@@ -6,9 +6,10 @@ import os
 import psutil
 from ui.styles import *
 from core.engine import VideoEngine
+from core.budget import MemoryBudget
 from ui.components import InfoCard, EffectCard
 from ui.graph import RealTimeGraph 
-from utils.logger import log 
+from utils.logger import log, setup_logging
 
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("dark-blue")
@@ -24,7 +25,9 @@ class VideoProcessingApp(ctk.CTk):
         self.cpu_count = os.cpu_count() or 4
         self.total_ram_gb = round(psutil.virtual_memory().total / (1024**3))
         self.max_workers = max(1, self.cpu_count - 1) 
-        self.max_buffer_slots = min(int((self.total_ram_gb * 0.25 * 1024) / 6), 300)
+        # Until a file is probed, size the buffer slider for 1080p frames
+        self.memory_budget = MemoryBudget()
+        self.max_buffer_slots = self._budget_slots(1920 * 1080 * 3)
 
         # Window Setup - COMPACT
         self.title("LuminaFlow Pro")
@@ -35,6 +38,7 @@ class VideoProcessingApp(ctk.CTk):
         self.selected_file = ""
         self.active_effects = []
         self.ui_is_processing = False 
+        self.start_thread = None      # Runs engine.start(), which can take a while under forkserver
         self.effect_cards = {} 
 
         # --- GRID ---
@@ -207,12 +211,30 @@ class VideoProcessingApp(ctk.CTk):
     def _update_buffer_label(self, value):
         self.lbl_buffer.configure(text=f"Buffer: {int(value)} frames")
 
+    def _budget_slots(self, frame_nbytes):
+        workers = max(1, self.max_workers // 2)
+        return max(11, min(self.memory_budget.max_slots(frame_nbytes, workers), 300))
+
+    def _resize_buffer_slider(self, shape):
+        """Re-limits the buffer slider to what the budget allows for this frame size."""
+        self.max_buffer_slots = self._budget_slots(shape[0] * shape[1] * shape[2])
+        self.slider_buffer.configure(to=self.max_buffer_slots, number_of_steps=min(20, self.max_buffer_slots - 10))
+        if self.slider_buffer.get() > self.max_buffer_slots:
+            self.slider_buffer.set(self.max_buffer_slots)
+        self._update_buffer_label(self.slider_buffer.get())
+
     def _select_file(self):
         filename = filedialog.askopenfilename(filetypes=[("Video Files", "*.mp4 *.avi *.mov")])
         if filename:
             self.selected_file = filename
             self.lbl_file.configure(text=os.path.basename(filename))
             self.log(f"Selected: {filename}")
+            try:
+                info = VideoEngine.probe(filename)
+                self._resize_buffer_slider(info["shape"])
+                self.log(f"Frame: {info['shape'][1]}x{info['shape'][0]} | Max buffer: {self.max_buffer_slots} frames")
+            except Exception as e:
+                self.log(f"Probe failed: {e}", "error")
             self.btn_start.configure(text="START PROCESSING")
             self.graph_frame.reset() 
 
@@ -230,7 +252,8 @@ class VideoProcessingApp(ctk.CTk):
             buffer = int(self.slider_buffer.get())
             
             self.log("Initializing...")
-            threading.Thread(target=self._run_engine, args=(output_file, workers, buffer)).start()
+            self.start_thread = threading.Thread(target=self._run_engine, args=(output_file, workers, buffer))
+            self.start_thread.start()
             
             self.ui_is_processing = True
             self.btn_start.configure(text="STOP ENGINE", fg_color="#C0392B", hover_color="#8B0000")
@@ -245,6 +268,7 @@ class VideoProcessingApp(ctk.CTk):
     def _run_engine(self, output, workers, buffer):
         try:
             self.engine.start(self.selected_file, output, workers, buffer, self.active_effects)
+            self.log(self.engine.memory_plan.summary())
             self.log("Pipeline Active.")
         except Exception as e:
             self.log(f"Error: {e}", "error")
@@ -252,14 +276,27 @@ class VideoProcessingApp(ctk.CTk):
 
     def _update_metrics(self):
         if self.ui_is_processing:
-            is_alive = self.engine.check_health()
+            # Until start() returns the engine may have no live children yet
+            is_alive = self.engine.check_health() or self.start_thread.is_alive()
             if is_alive:
-                elapsed, fps, frames = self.engine.get_progress()
-                self.card_time.update_value(f"{elapsed:.1f}s")
-                self.card_fps.update_value(f"{int(fps)}")
-                self.graph_frame.update_graph(elapsed, fps)
+                progress = self.engine.get_snapshot()
+                if progress is not None:
+                    eta = progress.eta
+                    self.card_time.update_value(f"{progress.elapsed:.1f}s" + (f" | ETA {eta:.0f}s" if eta is not None else ""))
+                    self.card_fps.update_value(f"{int(progress.fps)}")
+                    self.graph_frame.update_graph(progress.elapsed, progress.fps)
+
+                    # Switch to a real progress bar once the frame total is known
+                    if progress.fraction is not None:
+                        if self.progress_bar.cget("mode") == "indeterminate":
+                            self.progress_bar.stop()
+                            self.progress_bar.configure(mode="determinate")
+                        self.progress_bar.set(progress.fraction)
             else:
-                self.log("Task Completed.")
+                if self.engine.error:
+                    self.log(f"Task Failed: {self.engine.error} (output is incomplete)", "error")
+                else:
+                    self.log("Task Completed.")
                 self.engine.stop()
                 self._reset_ui_state()
         self.after(500, self._update_metrics)
@@ -268,6 +305,7 @@ class VideoProcessingApp(ctk.CTk):
         self.ui_is_processing = False
         self.btn_start.configure(text="START PROCESSING", fg_color=ACCENT, hover_color="#144870")
         self.progress_bar.stop()
+        self.progress_bar.configure(mode="determinate")
         self.progress_bar.set(0)
 
     def log(self, message, level="info"):
@@ -278,5 +316,6 @@ class VideoProcessingApp(ctk.CTk):
         self.console.see("end")
 
 if __name__ == "__main__":
+    setup_logging()
     app = VideoProcessingApp()
     app.mainloop()
\ No newline at end of file
@@ -1,8 +1,5 @@
 import tkinter as tk
 import customtkinter as ctk
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-import numpy as np
 
 class RealTimeGraph(ctk.CTkFrame):
     def __init__(self, parent, title="Live Performance (FPS)", **kwargs):
@@ -11,6 +8,17 @@ class RealTimeGraph(ctk.CTkFrame):
         # Title
         self.lbl_title = ctk.CTkLabel(self, text=title, font=("Roboto", 11, "bold"), text_color="#A0A0A0")
         self.lbl_title.pack(anchor="w", padx=10, pady=(5, 0))
+
+        self.x_data = []
+        self.y_data = []
+        self.canvas = None
+
+        # Matplotlib is slow to import: build the plot after the window is up
+        self.after(100, self._build_plot)
+
+    def _build_plot(self):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
         
         # Matplotlib Figure - COMPACT HEIGHT
         # Changed (5, 2) -> (5, 1.5)
@@ -32,15 +40,17 @@ class RealTimeGraph(ctk.CTkFrame):
         self.line, = self.ax.plot([], [], color='#2CC985', linewidth=1.5)
         self.ax.grid(True, color='#404040', linestyle='--', linewidth=0.5)
         
-        self.x_data = []
-        self.y_data = []
-        
         self.canvas = FigureCanvasTkAgg(self.fig, master=self)
         self.canvas.get_tk_widget().pack(fill="both", expand=True, padx=5, pady=5)
+        self._redraw()
         
     def update_graph(self, x_val, y_val):
         self.x_data.append(x_val)
         self.y_data.append(y_val)
+        self._redraw()
+
+    def _redraw(self):
+        if self.canvas is None: return
         
         self.line.set_data(range(len(self.y_data)), self.y_data)
         
@@ -53,5 +63,6 @@ class RealTimeGraph(ctk.CTkFrame):
     def reset(self):
         self.x_data = []
         self.y_data = []
+        if self.canvas is None: return
         self.line.set_data([], [])
         self.canvas.draw()
\ No newline at end of file
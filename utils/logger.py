@@ -6,8 +6,12 @@ from pathlib import Path
 def setup_logging():
     """
     Configures logging to file and console.
-    Returns a logger instance.
+    Returns a logger instance. Safe to call more than once.
     """
+    logger = logging.getLogger("LuminaFlow")
+    if getattr(setup_logging, "log_file", None):
+        return logger
+
     # Create logs directory in user's home folder (standard practice)
     log_dir = Path.home() / ".luminaflow" / "logs"
     log_dir.mkdir(parents=True, exist_ok=True)
@@ -25,9 +29,10 @@ def setup_logging():
         ]
     )
     
-    logger = logging.getLogger("LuminaFlow")
+    setup_logging.log_file = log_file
     logger.info(f"Logging initialized. Saving to: {log_file}")
     return logger
 
-# Singleton instance
-log = setup_logging()
\ No newline at end of file
+# Shared logger; handlers (and the session file) are attached by setup_logging()
+# from the entry point, so importing this module never touches the disk.
+log = logging.getLogger("LuminaFlow")
\ No newline at end of file